@@ -0,0 +1,128 @@
+# admission.py — Admission Control & Load Shedding
+# Two limits keep latency bounded when traffic spikes:
+#   hard   requests in progress on the chat routes, until their response body
+#          is fully sent; past LBA_MAX_IN_FLIGHT new ones are shed with
+#          503 + Retry-After before doing any work
+#   soft   plan requests admitted to the model (queued or generating); past
+#          LBA_ADMISSION_DEGRADE_AT, or when the expected wait would miss the
+#          request's deadline, the request is answered with the `general`
+#          template, marked degraded, without the model
+# The expected wait is an EWMA of model time per request, times the number
+# of rounds the inference pool needs to reach a newly admitted request.
+# Background work (bulk misses, clarifier learning) is admitted through the
+# same slots but never degraded: it waits while half the soft limit is in use,
+# so interactive requests keep the other half.
+
+import math
+import threading
+import time
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+from typing import Optional
+
+import metrics
+
+class DeadlineExceeded(Exception):
+    """Raised inside slot() when the request's deadline passes; its time still feeds the estimate."""
+
+class Admission:
+    def __init__(self, max_in_flight: int = 256, degrade_at: int = 32, workers: int = 4, alpha: float = 0.2):
+        self.max_in_flight = max_in_flight
+        self.degrade_at = degrade_at
+        self.background_limit = max(1, degrade_at // 2)
+        self.workers = max(1, workers)
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.freed = threading.Condition(self.lock)
+        self.in_flight = 0
+        self.admitted = 0
+        self.latency = None  # EWMA seconds of model time per admitted request
+        self.counts = {"admitted": 0, "degraded_queue": 0, "degraded_deadline": 0, "degraded_timeout": 0, "shed": 0}
+
+    # --- hard limit ---
+    def enter(self) -> bool:
+        """Claims an in-flight slot; False means shed the request."""
+        with self.lock:
+            if self.in_flight >= self.max_in_flight:
+                self._count("shed")
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    # --- soft limit ---
+    def expected_wait(self, queued: Optional[int] = None) -> float:
+        """Seconds until a request admitted now would finish, from recent model times."""
+        if self.latency is None: return 0.0
+        queued = self.admitted if queued is None else queued
+        return self.latency * math.ceil((queued + 1) / self.workers)
+
+    def overloaded(self) -> bool:
+        """True while optional model work (e.g. background generations) should be skipped."""
+        return self.admitted >= self.background_limit
+
+    def decide(self, deadline_s: float) -> Optional[str]:
+        """None to admit, else the reason to degrade: 'queue' or 'deadline'."""
+        with self.lock:
+            if self.admitted >= self.degrade_at:
+                reason = "queue"
+            elif self.expected_wait() > deadline_s:
+                reason = "deadline"
+            else:
+                return None
+            self._count("degraded_" + reason)
+            return reason
+
+    @contextmanager
+    def slot(self, background: bool = False, cancel: Optional[threading.Event] = None):
+        """
+        Holds an admission slot around model work and feeds its duration into
+        the estimate. Background slots first wait for room (raising
+        CancelledError if `cancel` is set meanwhile). A DeadlineExceeded from
+        the block counts as a degraded answer and feeds the time it took, so a
+        model slower than the deadlines is noticed and later requests degrade
+        up front instead of each waiting out its own deadline.
+        """
+        with self.lock:
+            while background and self.admitted >= self.background_limit:
+                if cancel is not None and cancel.is_set(): raise CancelledError()
+                self.freed.wait(0.05)
+            self.admitted += 1
+            self._count("admitted")
+        start = time.perf_counter()
+        completed = timed_out = False
+        try:
+            yield
+            completed = True
+        except DeadlineExceeded:
+            timed_out = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.admitted -= 1
+                self.freed.notify_all()
+                if timed_out: self._count("degraded_timeout")
+                # Abandoned requests (disconnect, cancel) say little about service time
+                if completed or timed_out:
+                    self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+
+    def _count(self, result: str):
+        self.counts[result] += 1
+        metrics.ADMISSION.inc(result=result)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "max_in_flight": self.max_in_flight,
+                "degrade_at": self.degrade_at,
+                "background_limit": self.background_limit,
+                "latency_ewma_s": round(self.latency, 3) if self.latency is not None else None,
+                "expected_wait_s": round(self.expected_wait(), 3),
+                "totals": dict(self.counts),
+            }
@@ -1,36 +1,138 @@
 # app.py — Life Breakdown Assistant Backend
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import admission
+import asyncio
+import bulk
+import clarifier
+import contextvars
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
 import uvicorn
 import logging
+import config
+import metrics
 import model  # Imports our new logic module
+import sessions
 
 # Initialize
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load the AI Brain
-brain = model.LifeGuideAI()
+# The AI Brain; the model itself loads in the background once the server starts
+brain = model.LifeGuideAI(autoload=False)
+
+# Model work runs here so the event loop stays free for cheap requests
+inference_pool = ThreadPoolExecutor(max_workers=config.INFERENCE_WORKERS, thread_name_prefix="inference")
+
+# Bounds the work in progress: sheds past MAX_IN_FLIGHT, degrades to the general template past ADMISSION_DEGRADE_AT
+admission_control = admission.Admission(config.MAX_IN_FLIGHT, config.ADMISSION_DEGRADE_AT, config.INFERENCE_WORKERS)
+
+# Bulk jobs (/chat/batch) share one bounded pool for their model misses, admitted as background work
+bulk_planner = bulk.BulkPlanner(brain, config.BULK_WINDOW, admission_control)
+
+# Earlier turns of session-based conversations (see ChatRequest)
+session_store = sessions.make_store(config.SESSION_MAX, config.SESSION_IDLE_S, config.SESSION_PATH or None)
+
+def learn_question(prompt: str) -> Optional[str]:
+    """Background clarifier generation, admitted like bulk work; None (try again later) while the model is down or busy."""
+    if not brain.ready or admission_control.overloaded(): return None
+    with admission_control.slot(background=True):
+        return brain.safe_generate(prompt, 30)
+
+# Questions for vague first turns; model-written ones are generated in the background once the model is up
+clarifications = clarifier.Clarifier(
+    config.CLARIFY_CACHE_SIZE, config.CLARIFY_PATH or None,
+    generate=learn_question if config.CLARIFY_LEARN else None,
+)
+
+metrics.QUEUE_DEPTH.fn = lambda: brain.batcher.queue.qsize() if brain.batcher else None
+metrics.ADMITTED.fn = lambda: admission_control.admitted
+metrics.IN_FLIGHT.fn = lambda: admission_control.in_flight
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Template hits are served immediately; model routes report "warming" until ready
+    brain.start(background=True)
+    yield
 
 app = FastAPI(
     title="Life Breakdown Assistant API",
     description="Backend for transforming life problems into structured JSON plans.",
-    version="2.0"
+    version="2.0",
+    lifespan=lifespan
 )
 
+SHED_PATHS = {"/chat", "/chat/stream", "/chat/batch"}
+
+class ShedLoad:
+    """
+    Past MAX_IN_FLIGHT chat requests, new ones are turned away before any work
+    (added first, so timings still see them). Plain ASGI rather than
+    @app.middleware: call_next returns once the headers are out, while a
+    streamed or bulk body is still being produced, and the slot must be held
+    until the body is sent.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in SHED_PATHS: return await self.app(scope, receive, send)
+        if not admission_control.enter():
+            response = JSONResponse(
+                status_code=503, headers={"Retry-After": str(config.SHED_RETRY_AFTER_S)},
+                content={"status": "overloaded", "detail": "Too many requests in progress; retry shortly."}
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_control.leave()
+
+app.add_middleware(ShedLoad)
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Request latency histogram, plus an optional Server-Timing header with per-stage durations."""
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    path = request.url.path if request.url.path in ROUTE_PATHS else "other"
+    metrics.REQUEST_SECONDS.observe(elapsed, path=path, status=response.status_code)
+    if config.TIMING_HEADER:
+        response.headers["Server-Timing"] = metrics.server_timing({**timings, "total": elapsed})
+    return response
+
 # --- Schemas ---
 class ChatMessage(BaseModel):
     role: str
     content: str
 class ChatRequest(BaseModel):
-    conversation_history: List[ChatMessage]
+    """
+    Either the full `conversation_history` (stateless), or just the new
+    `message` plus the `session_id` returned by the previous turn (omit it on
+    the first turn).
+    """
+    conversation_history: List[ChatMessage] = []
+    session_id: Optional[str] = None
+    message: Optional[str] = None
 class ChatResponse(BaseModel):
     type: str 
     text: Optional[str] = None
     plan: Optional[model.FinalPlan] = None
+    session_id: Optional[str] = None
+    degraded: bool = False  # plan is the general template, sent instead of a model plan under overload
 
 # --- Routes ---
 
@@ -39,36 +141,292 @@ def read_root():
     """Serves the frontend interface."""
     return FileResponse('index.html')
 
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness: 200 once the model is loaded and warm. A failed load ("unavailable",
+    mock answers) stays 503, so load balancers route around the worker. pid tells serve.py workers apart.
+    """
+    return JSONResponse(status_code=200 if brain.status == "ready" else 503, content={"status": brain.status, "pid": os.getpid()})
+
+def warming_response():
+    return JSONResponse(
+        status_code=503, headers={"Retry-After": "5"},
+        content={"status": "warming", "detail": f"Model is {brain.status}; retry shortly."}
+    )
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of stage timings, token counts, lookups and errors."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+def stats():
+    """Micro-batching queue depth, batch-size distribution, cache, session, knowledge-base, clarifier and admission counters."""
+    return {
+        "scheduler": brain.batcher.stats() if brain.batcher else None,
+        "plan_cache": brain.plan_cache.stats() if brain.plan_cache else None,
+        "sessions": session_store.stats(),
+        "knowledge_base": model.KNOWLEDGE.stats(),
+        "backend": brain.backend.stats() if hasattr(brain.backend, "stats") else None,
+        "clarifier": clarifications.stats(),
+        "admission": admission_control.stats(),
+    }
+
+class ClientDisconnected(Exception):
+    pass
+
+def request_deadline(request: Request) -> float:
+    """Seconds the client will wait: the X-Deadline-Ms header, capped at REQUEST_TIMEOUT_S."""
+    try:
+        return min(float(request.headers["X-Deadline-Ms"]) / 1000, config.REQUEST_TIMEOUT_S)
+    except (KeyError, ValueError):
+        return config.REQUEST_TIMEOUT_S
+
+async def run_inference(request: Request, fn, *args, timeout: Optional[float] = None):
+    """
+    Runs a model-bound call on the inference pool.
+    Gives up after `timeout` (default REQUEST_TIMEOUT_S) or when the client
+    disconnects; either way the cancel event withdraws any of its prompts
+    still waiting for the model.
+    """
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    # copy_context so stage timings recorded on the pool thread land on this request
+    work = loop.run_in_executor(inference_pool, contextvars.copy_context().run, functools.partial(fn, *args, cancel=cancel))
+    deadline = loop.time() + (config.REQUEST_TIMEOUT_S if timeout is None else timeout)
+    try:
+        while True:
+            done, _ = await asyncio.wait({work}, timeout=min(0.25, max(0.0, deadline - loop.time())))
+            if done: return work.result()
+            if await request.is_disconnected(): raise ClientDisconnected()
+            if loop.time() >= deadline: raise admission.DeadlineExceeded()
+    finally:
+        cancel.set()
+
+class Turn(NamedTuple):
+    user_input: str            # this turn's message
+    user_turns: int            # user messages so far, including this one
+    problem: str               # all user messages so far, joined
+    session_id: Optional[str]  # None for stateless (full-history) requests
+
+def resolve_turn(req: ChatRequest) -> Turn:
+    """
+    Session requests extend the stored conversation with the new message (an
+    unknown or expired id starts a new session); history requests are read as sent.
+    """
+    if req.message is not None:
+        message = req.message.strip()
+        with metrics.stage("session"):
+            session = session_store.get(req.session_id) if req.session_id else None
+        if session is None: return Turn(message, 1, message, sessions.new_id())
+        return Turn(message, session.turns + 1, f"{session.problem} {message}", session.id)
+    if not req.conversation_history:
+        raise HTTPException(status_code=422, detail="Send `message` (with `session_id` after the first turn) or `conversation_history`.")
+    history = req.conversation_history
+    return Turn(history[-1].content.strip(), len([m for m in history if m.role == 'user']), problem_text(history), None)
+
+def clarify(turn: Turn, known: bool) -> Optional[ChatResponse]:
+    """
+    Ambiguity Check (Logic in app layer for fast response).
+    Returns a question ChatResponse for vague first turns ('Help me', or a
+    short input that is not a known topic), or None to go on to a plan.
+    `known`: the turn's problem matched a template (looked up once by the caller).
+    Questions come from the clarifier, never from a model call on this request.
+    """
+    user_input = turn.user_input
+    if turn.user_turns != 1 or len(user_input.split()) >= 3: return None
+    if "help" in user_input.lower() or not known:
+        with metrics.stage("clarify"):
+            return ChatResponse(type='question', text=clarifications.question(user_input))
+    return None
+
+def respond(resp: ChatResponse, turn: Turn) -> Response:
+    """Serializes explicitly so the cost shows up as its own stage."""
+    resp.session_id = turn.session_id
+    with metrics.stage("serialize"):
+        body = resp.model_dump_json()
+    return with_session(Response(content=body, media_type="application/json"), turn)
+
+# --- Knowledge-base Fast Path ---
+# A template hit's ChatResponse is assembled from bytes: the plan comes
+# pre-encoded from the knowledge base with only `problem` spliced in, so no
+# FinalPlan or ChatResponse is built, validated or serialized per request.
+_PLAN_HEAD, _PLAN_TAIL = ChatResponse(type='plan').model_dump_json().encode().split(b'"plan":null')
+
+def template_response_json(plan_json: bytes, session_id: Optional[str] = None, degraded: bool = False) -> bytes:
+    """Same document as ChatResponse(type='plan', plan=..., session_id=..., degraded=...).model_dump_json()."""
+    tail = _PLAN_TAIL if session_id is None else _PLAN_TAIL.replace(b'"session_id":null', b'"session_id":' + json.dumps(session_id).encode())
+    if degraded: tail = tail.replace(b'"degraded":false', b'"degraded":true')
+    return _PLAN_HEAD + b'"plan":' + plan_json + tail
+
+def degraded_json(problem: str, session_id: Optional[str] = None) -> bytes:
+    """The general template for this problem, flagged degraded: the answer when the model cannot be reached in time."""
+    kb = model.KNOWLEDGE.current
+    return template_response_json(kb.plan_json(kb.FALLBACK_TOPIC, problem), session_id, degraded=True)
+
+def with_session(response: Response, turn: Turn, store: bool = True) -> Response:
+    """
+    Stores the turn once it is answered (not on 503/504, which clients retry).
+    The id is also sent as a header, so streaming clients have it before the first event.
+    store=False: the response body stores the turn itself once it has been sent (plan_events).
+    """
+    if turn.session_id and response.status_code < 300:
+        if store: store_turn(turn)
+        response.headers["X-Session-Id"] = turn.session_id
+    return response
+
+def store_turn(turn: Turn):
+    if not turn.session_id: return
+    with metrics.stage("session"):
+        session_store.add_turn(turn.session_id, turn.user_input)
+
+def problem_text(history: List[ChatMessage]) -> str:
+    return " ".join([m.content for m in history if m.role == 'user'])
+
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(req: ChatRequest):
+async def chat_endpoint(req: ChatRequest, request: Request):
     """
     Main endpoint.
     1. Checks for ambiguity (e.g. 'Help me').
     2. Otherwise, generates a full plan using the model.
+    Template hits and canned replies are answered on the event loop;
+    only model calls go to the inference pool.
     """
-    history = req.conversation_history
-    user_turns = len([m for m in history if m.role == 'user'])
-    user_input = history[-1].content.strip()
-
-    # 1. Ambiguity Check (Logic in app layer for fast response)
-    if user_turns == 1:
-        # Catch "Help me"
-        if len(user_input.split()) < 3 and "help" in user_input.lower():
-             return ChatResponse(type='question', text="I'm here to help. What specific goal are we planning today?")
-        
-        # Catch other vagueness if not a known topic
-        if len(user_input.split()) < 3 and not brain.find_template(user_input):
-             q = brain.safe_generate(f"Ask user for details about '{user_input}'. Question:", 30)
-             if "question" in q.lower() or len(q) < 5: q = "Could you give me more details?"
-             return ChatResponse(type='question', text=q)
-
-    # 2. Plan Generation
-    full_problem = " ".join([m.content for m in history if m.role == 'user'])
-    
-    # Delegate complex logic to the model
-    plan = brain.infer_plan(full_problem)
-    
-    return ChatResponse(type='plan', plan=plan)
+    turn = resolve_turn(req)
+    # One keyword lookup serves both the ambiguity check and the fast path
+    plan_json = brain.template_json(turn.problem)
+    reply = clarify(turn, plan_json is not None)
+    if reply: return respond(reply, turn)
+    try:
+        # 2. Plan Generation
+        full_problem = turn.problem
+
+        # Knowledge base hits never touch the model (or pydantic: they are pre-encoded)
+        if plan_json:
+            with metrics.stage("serialize"):
+                body = template_response_json(plan_json, turn.session_id)
+            return with_session(Response(content=body, media_type="application/json"), turn)
+
+        if not brain.ready: return warming_response()
+        # Semantic and plan-cache hits are answered even under overload
+        plan = await asyncio.to_thread(brain.retrieve_plan, full_problem)
+        if plan: return respond(ChatResponse(type='plan', plan=plan), turn)
+        # Overloaded, or the model would not answer within the deadline: degrade instead of queueing
+        deadline = request_deadline(request)
+        if admission_control.decide(deadline):
+            return with_session(Response(content=degraded_json(full_problem, turn.session_id), media_type="application/json"), turn)
+        # Delegate complex logic to the model
+        try:
+            with admission_control.slot():
+                plan = await run_inference(request, brain.generate_plan, full_problem, timeout=deadline)
+        except admission.DeadlineExceeded:
+            return with_session(Response(content=degraded_json(full_problem, turn.session_id), media_type="application/json"), turn)
+        return respond(ChatResponse(type='plan', plan=plan), turn)
+    except ClientDisconnected:
+        logger.info("Client disconnected; abandoned plan generation.")
+        return Response(status_code=499)
+
+# --- Streaming (Server-Sent Events) ---
+
+def sse(event: str, data):
+    """One event; `data` may also be JSON already encoded as bytes."""
+    if isinstance(data, bytes): return f"event: {event}\ndata: ".encode() + data + b"\n\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_once(event: str, data) -> StreamingResponse:
+    return StreamingResponse(iter([sse(event, data)]), media_type="text/event-stream")
+
+async def plan_events(turn: Turn, timeout: Optional[float] = None):
+    """
+    Pulls sections off brain.stream_plan on the inference pool and emits them as
+    they finish (lookups already missed). A disconnect cancels this generator;
+    the finally block then withdraws the remaining prompts from the model queue.
+    The session turn is stored only once the final `plan` event has been sent.
+    """
+    problem, session_id = turn.problem, turn.session_id
+    loop = asyncio.get_running_loop()
+    cancel = threading.Event()
+    sections = brain.stream_plan(problem, cancel, lookup=False)
+    context = contextvars.copy_context()
+    deadline = loop.time() + (config.REQUEST_TIMEOUT_S if timeout is None else timeout)
+    try:
+        with admission_control.slot():
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        loop.run_in_executor(inference_pool, context.run, next, sections, None), deadline - loop.time()
+                    )
+                except asyncio.TimeoutError:
+                    raise admission.DeadlineExceeded()  # inside the slot, so it is counted and feeds the estimate
+                if item is None: break
+                if isinstance(item, model.FinalPlan):
+                    yield sse("plan", ChatResponse(type='plan', plan=item, session_id=session_id).model_dump())
+                    store_turn(turn)
+                    break
+                yield sse("section", item)
+    except admission.DeadlineExceeded:
+        # Deadline passed mid-plan: finish with the general template rather than an error
+        yield sse("plan", degraded_json(problem, session_id))
+        store_turn(turn)
+    except Exception as e:
+        # The headers are already sent, so a failure can only be reported in-band
+        logger.error(f"Plan stream failed: {e}")
+        yield sse("error", {"detail": "Plan generation failed; please try again."})
+    finally:
+        cancel.set()
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, request: Request):
+    """
+    Streaming variant of /chat (text/event-stream).
+    Events: `question` (a ChatResponse), `section` ({field, slot, value}) per
+    generated plan section, and a final `plan` carrying the full ChatResponse,
+    or an `error` ({detail}) if generation fails mid-stream.
+    Template hits and degraded (overload) answers arrive as a single `plan` event.
+    """
+    turn = resolve_turn(req)
+    plan_json = brain.template_json(turn.problem)
+    reply = clarify(turn, plan_json is not None)
+    if reply:
+        reply.session_id = turn.session_id
+        return with_session(sse_once("question", reply.model_dump()), turn)
+
+    if plan_json: return with_session(sse_once("plan", template_response_json(plan_json, turn.session_id)), turn)
+    if not brain.ready: return with_session(warming_response(), turn)
+    plan = await asyncio.to_thread(brain.retrieve_plan, turn.problem)
+    if plan: return with_session(sse_once("plan", ChatResponse(type='plan', plan=plan, session_id=turn.session_id).model_dump()), turn)
+    deadline = request_deadline(request)
+    if admission_control.decide(deadline): return with_session(sse_once("plan", degraded_json(turn.problem, turn.session_id)), turn)
+    return with_session(StreamingResponse(plan_events(turn, deadline), media_type="text/event-stream"), turn, store=False)
+
+# --- Bulk Generation ---
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: Request):
+    """
+    Bulk plan generation. The body is JSONL: one problem per line, as a JSON
+    string, {"problem": ...} or {"conversation_history": [...]}. The response
+    is JSONL (application/x-ndjson) with one FinalPlan per input line, in
+    input order, streamed as plans finish; lines that cannot be read or planned get {"error": ...}.
+    """
+    if not brain.ready: return warming_response()
+    # The body is spooled first (to disk past 1 MB, so any size fits in constant
+    # memory): a streaming response cannot also keep reading the request
+    body = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    async for chunk in request.stream(): body.write(chunk)
+    body.seek(0)
+    return StreamingResponse(
+        (line + "\n" for line in bulk_planner.lines(body)),
+        media_type="application/x-ndjson", background=BackgroundTask(body.close)
+    )
+
+ROUTE_PATHS = {route.path for route in app.routes}
 
 if __name__ == "__main__":
     print("Starting Life Breakdown Server...")
@@ -0,0 +1,237 @@
+# backends.py — CPU Inference Backends
+# Everything that turns a batch of (prompt, max_tokens) into text sits behind
+# one interface, so the serving code does not care how the model is run:
+#   eager     fp32 model as loaded (previous behaviour)
+#   int8      torch dynamic quantization of every nn.Linear to int8
+#   compiled  torch.compile'd forward pass (falls back to eager without torch 2.x)
+#   assisted  speculative decoding: a small draft model proposes, the base model verifies
+#   mock      no model: deterministic text after a per-token delay (benchmarks, offline runs)
+# Compare them with: python -m benchmarks.backends
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# on_row(i, text): row i of the batch is final, before the rest of the batch finishes
+RowCallback = Optional[Callable[[int, str], None]]
+
+class RowsFinished:
+    """
+    Stopping criteria for a padded batch: each row stops at EOS or at its own
+    token budget, and is reported through on_row at that step, so a short
+    section is not held until the batch's longest row is done. Returns one
+    flag per row (transformers >= 4.39 stops rows individually).
+    """
+    def __init__(self, backend, limits: List[int], eos_id: int, on_row):
+        self.backend = backend
+        self.limits = limits
+        self.eos_id = eos_id
+        self.on_row = on_row
+        self.finished = [False] * len(limits)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        new_tokens = input_ids.shape[1] - 1  # position 0 is the decoder start token
+        for i, ids in enumerate(input_ids):
+            if self.finished[i]: continue
+            if new_tokens >= self.limits[i] or int(ids[-1]) == self.eos_id:
+                self.finished[i] = True
+                self.on_row(i, self.backend.decode_row(ids, self.limits[i]))
+        return self.backend.torch.tensor(self.finished, device=input_ids.device)
+
+class EagerBackend:
+    name = "eager"
+
+    def __init__(self, model_id: str, threads: int = 0):
+        import torch
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        self.torch = torch
+        # Intra-op threads are process-wide; the micro-batcher's single worker is the only user
+        if threads > 0: torch.set_num_threads(threads)
+        self.threads = torch.get_num_threads()
+        self.model_id = model_id
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = self.prepare(AutoModelForSeq2SeqLM.from_pretrained(model_id).eval())
+
+    def prepare(self, model):
+        """Hook for subclasses to transform the loaded fp32 model."""
+        return model
+
+    def set_threads(self, threads: int):
+        """Re-sizes the intra-op pool, e.g. in a forked worker given a share of the cores."""
+        self.torch.set_num_threads(threads)
+        self.threads = threads
+
+    def generate(self, requests: List[Tuple[str, int]], decoding: Dict, on_row: RowCallback = None) -> List[str]:
+        """
+        Generates several (prompt, max_tokens) pairs in one padded forward pass.
+        The batch decodes up to the largest budget; each row is then clipped to its own.
+        With on_row, each row also stops (and is reported) at EOS or its own budget.
+        """
+        limits = [max_tokens for _, max_tokens in requests]
+        inputs = self.tokenizer(
+            [prompt for prompt, _ in requests],
+            return_tensors="pt", padding=True, truncation=True, max_length=512
+        )
+        stopping = {}
+        if on_row is not None:
+            from transformers import StoppingCriteriaList
+            stopping["stopping_criteria"] = StoppingCriteriaList([RowsFinished(self, limits, self.tokenizer.eos_token_id, on_row)])
+        with self.torch.inference_mode():
+            output_ids = self.model.generate(**inputs, max_new_tokens=max(limits), **decoding, **stopping)
+        for n in inputs["attention_mask"].sum(dim=1).tolist():
+            metrics.INPUT_TOKENS.observe(n)
+        for ids, limit in zip(output_ids, limits):
+            metrics.OUTPUT_TOKENS.observe(min(limit, int((ids[1:] != self.tokenizer.pad_token_id).sum())))
+        return [self.decode_row(ids, limit) for ids, limit in zip(output_ids, limits)]
+
+    def decode_row(self, ids, limit: int) -> str:
+        # Position 0 of each row is the decoder start token, so the first `limit` new tokens are [1:limit+1]
+        return self.tokenizer.decode(ids[1:limit + 1], skip_special_tokens=True).strip()
+
+class Int8Backend(EagerBackend):
+    name = "int8"
+
+    def prepare(self, model):
+        # Weights stored as int8, activations quantized on the fly: ~4x smaller Linear layers
+        return self.torch.quantization.quantize_dynamic(model, {self.torch.nn.Linear}, dtype=self.torch.qint8)
+
+class CompiledBackend(EagerBackend):
+    name = "compiled"
+
+    def prepare(self, model):
+        if not hasattr(self.torch, "compile"):
+            logger.warning("torch.compile unavailable (torch < 2.0); using eager model.")
+            return model
+        # dynamic=True: batch size and sequence length change on every call
+        model.forward = self.torch.compile(model.forward, dynamic=True)
+        return model
+
+class AssistedBackend(EagerBackend):
+    """
+    Assisted (speculative) decoding. The draft model (flan-t5-small by default)
+    proposes a few tokens; the base model scores them all in one forward pass
+    and keeps the prefix it agrees with, plus one token of its own. Only with
+    greedy decoding (do_sample=False, i.e. LBA_DETERMINISTIC=1) is the output
+    the same as eager, with fewer base-model passes; the default sampled
+    decoding gives different text from run to run.
+    transformers decodes assisted generation one sequence at a time, so small
+    batches (<= LBA_ASSISTED_MAX_BATCH) go row by row and larger ones, where
+    padded batching wins, use plain eager decoding. If the draft model cannot
+    be loaded, everything uses plain eager decoding.
+    """
+    name = "assisted"
+
+    def prepare(self, model):
+        self.draft = None
+        self.lock = threading.Lock()
+        self.proposed = self.accepted = self.new_tokens = 0
+        self.decode_seconds = 0.0
+        self.steps = {"target": 0, "draft": 0}  # forward passes, counted by hooks
+        try:
+            from transformers import AutoModelForSeq2SeqLM
+            draft = AutoModelForSeq2SeqLM.from_pretrained(config.DRAFT_MODEL_ID).eval()
+            draft.generation_config.num_assistant_tokens = config.DRAFT_TOKENS
+            draft.register_forward_hook(lambda *_: self.count("draft"))
+            model.register_forward_hook(lambda *_: self.count("target"))
+            self.draft = draft
+            logger.info(f"Assisted decoding with draft model {config.DRAFT_MODEL_ID}.")
+        except Exception as e:
+            logger.warning(f"Draft model {config.DRAFT_MODEL_ID} unavailable ({e}); using plain decoding.")
+        return model
+
+    def count(self, which):
+        self.steps[which] += 1
+
+    def generate(self, requests: List[Tuple[str, int]], decoding: Dict, on_row: RowCallback = None) -> List[str]:
+        if self.draft is None or len(requests) > config.ASSISTED_MAX_BATCH:
+            return super().generate(requests, decoding, on_row)
+        outputs = []
+        for i, (prompt, max_tokens) in enumerate(requests):
+            outputs.append(self.generate_one(prompt, max_tokens, decoding))
+            if on_row: on_row(i, outputs[-1])
+        return outputs
+
+    def generate_one(self, prompt: str, max_tokens: int, decoding: Dict) -> str:
+        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
+        self.steps["target"] = self.steps["draft"] = 0
+        start = time.perf_counter()
+        with self.torch.inference_mode():
+            ids = self.model.generate(**inputs, max_new_tokens=max_tokens, assistant_model=self.draft, **decoding)[0]
+        elapsed = time.perf_counter() - start
+        # Position 0 is the decoder start token
+        new_tokens = int((ids[1:] != self.tokenizer.pad_token_id).sum())
+        # Each base-model pass yields its accepted draft tokens plus one of its own
+        accepted = max(0, min(new_tokens - self.steps["target"], self.steps["draft"]))
+        with self.lock:
+            self.proposed += self.steps["draft"]
+            self.accepted += accepted
+            self.new_tokens += new_tokens
+            self.decode_seconds += elapsed
+        metrics.DRAFT_TOKENS.inc(accepted, result="accepted")
+        metrics.DRAFT_TOKENS.inc(self.steps["draft"] - accepted, result="rejected")
+        metrics.INPUT_TOKENS.observe(int(inputs["attention_mask"].sum()))
+        metrics.OUTPUT_TOKENS.observe(new_tokens)
+        return self.tokenizer.decode(ids[1:], skip_special_tokens=True).strip()
+
+    def stats(self) -> dict:
+        """Draft acceptance and decode speed over every assisted generation so far."""
+        with self.lock:
+            return {
+                "draft_model": config.DRAFT_MODEL_ID if self.draft is not None else None,
+                "proposed_tokens": self.proposed,
+                "accepted_tokens": self.accepted,
+                "acceptance_rate": round(self.accepted / self.proposed, 3) if self.proposed else None,
+                "tokens_per_sec": round(self.new_tokens / self.decode_seconds, 1) if self.decode_seconds else None,
+            }
+
+class MockBackend:
+    """
+    Stand-in for the model with the same batching cost shape: a padded batch
+    takes (largest max_tokens) x LBA_MOCK_TOKEN_DELAY_MS, whatever its size,
+    and each row is done (reported to on_row) once its own max_tokens have passed.
+    Output depends only on the prompt, so runs are reproducible.
+    """
+    name = "mock"
+    WORDS = ["plan", "list", "call", "write", "book", "clear", "review", "start", "sort", "draft", "check", "finish"]
+
+    def __init__(self, model_id: str, threads: int = 0):
+        self.model_id = model_id
+        self.threads = threads
+        self.token_delay = config.MOCK_TOKEN_DELAY_MS / 1000
+        # Optional stand-in for weight memory (written, so it is resident), for worker memory checks
+        self.weights = b"\x01" * (config.MOCK_WEIGHTS_MB * 1024 * 1024)
+
+    def set_threads(self, threads: int):
+        self.threads = threads
+
+    def generate(self, requests: List[Tuple[str, int]], decoding: Dict, on_row: RowCallback = None) -> List[str]:
+        outputs = []
+        for prompt, max_tokens in requests:
+            seed = hashlib.sha256(prompt.encode("utf-8")).digest()
+            # Roughly one word per 4 tokens, in comma-separated three-word phrases
+            words = [self.WORDS[b % len(self.WORDS)] for b in seed[:max(3, max_tokens // 4)]]
+            outputs.append(", ".join(" ".join(words[i:i + 3]) for i in range(0, len(words), 3)))
+            metrics.INPUT_TOKENS.observe(len(prompt.split()))
+            metrics.OUTPUT_TOKENS.observe(len(words))
+        elapsed = 0
+        for limit in sorted({t for _, t in requests}):
+            time.sleep(self.token_delay * (limit - elapsed))
+            elapsed = limit
+            for i, (_, max_tokens) in enumerate(requests):
+                if on_row and max_tokens == limit: on_row(i, outputs[i])
+        return outputs
+
+BACKENDS = {b.name: b for b in (EagerBackend, Int8Backend, CompiledBackend, AssistedBackend, MockBackend)}
+
+def load_backend(name: str, model_id: str, threads: int = 0):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    logger.info(f"Loading {model_id} with the {name} backend...")
+    return BACKENDS[name](model_id, threads)
@@ -0,0 +1,110 @@
+# benchmarks/backends.py — Inference Backend Comparison
+# Runs a fixed prompt set (the real plan prompts over a few problems) through
+# each backend in its own process, then reports load time, batch latency,
+# decode tokens/sec, peak RSS and how often each backend's output matches the
+# eager fp32 model. Greedy decoding is used so differences come from the
+# backend, not sampling. The assisted backend also reports its draft
+# acceptance rate. --single sends one prompt per call (a lone request's
+# latency, where assisted decoding is meant to help) instead of one batch per plan.
+#
+# Usage: python -m benchmarks.backends --backends eager,int8,compiled,assisted --threads 4 [--single]
+
+import argparse
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+
+PROBLEMS = [
+    "I keep putting off my tax return",
+    "I want to move to a new city next month",
+    "My inbox has 3000 unread emails",
+    "I need to prepare for a job interview on Friday",
+]
+
+def prompt_set():
+    from model import PLAN_PROMPTS
+    return [[(p.format(problem=problem), t) for _, _, p, t in PLAN_PROMPTS] for problem in PROBLEMS]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def output_tokens():
+    """Generated tokens so far, from the backends' own lba_output_tokens histogram."""
+    import metrics
+    return metrics.OUTPUT_TOKENS.series.get((), [0, 0])[-2]
+
+def run_backend(name, model_id, threads, repeat, single):
+    """Child process: load one backend, time it, return its outputs."""
+    from backends import load_backend
+    from model import GREEDY_DECODING
+    start = time.perf_counter()
+    backend = load_backend(name, model_id, threads)
+    load_s = time.perf_counter() - start
+
+    batches = prompt_set()
+    if single: batches = [[p] for batch in batches for p in batch]
+    backend.generate(batches[0], GREEDY_DECODING)  # warmup (and compilation for 'compiled')
+    latencies, outputs = [], []
+    tokens_before = output_tokens()
+    for _ in range(repeat):
+        outputs = []
+        for batch in batches:
+            start = time.perf_counter()
+            outputs.extend(backend.generate(batch, GREEDY_DECODING))
+            latencies.append(time.perf_counter() - start)
+    return {
+        "backend": name,
+        "threads": backend.threads,
+        "load_s": round(load_s, 2),
+        "plan_latency_ms_p50": round(statistics.median(latencies) * 1000, 1),
+        "plan_latency_ms_mean": round(statistics.mean(latencies) * 1000, 1),
+        "tokens_per_sec": round((output_tokens() - tokens_before) / sum(latencies), 1),
+        "acceptance_rate": backend.stats()["acceptance_rate"] if hasattr(backend, "stats") else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "outputs": outputs,
+    }
+
+def agreement(outputs, reference):
+    """Exact-match rate and mean token Jaccard overlap against the reference outputs."""
+    exact = sum(a == b for a, b in zip(outputs, reference)) / len(reference)
+    overlaps = []
+    for a, b in zip(outputs, reference):
+        ta, tb = set(a.lower().split()), set(b.lower().split())
+        overlaps.append(len(ta & tb) / len(ta | tb) if ta | tb else 1.0)
+    return round(exact, 3), round(statistics.mean(overlaps), 3)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", default="eager,int8,compiled,assisted")
+    parser.add_argument("--model", default="google/flan-t5-base")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--single", action="store_true", help="one prompt per generate call instead of one batch per plan")
+    parser.add_argument("--out", help="optional JSON report path")
+    args = parser.parse_args()
+
+    names = args.backends.split(",")
+    if "eager" not in names: names.insert(0, "eager")  # the agreement reference
+    ctx = multiprocessing.get_context("spawn")  # fresh process per backend so RSS is its own
+    results = []
+    for name in names:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(run_backend, (name, args.model, args.threads, args.repeat, args.single)))
+
+    reference = results[0]["outputs"]
+    print(f"{'backend':<10}{'threads':>8}{'load s':>8}{'p50 ms':>9}{'mean ms':>9}{'tok/s':>8}{'accept':>8}{'RSS MB':>9}{'exact':>7}{'jaccard':>9}")
+    for r in results:
+        r["exact_match"], r["token_jaccard"] = agreement(r["outputs"], reference)
+        accept = "-" if r["acceptance_rate"] is None else r["acceptance_rate"]
+        print(f"{r['backend']:<10}{r['threads']:>8}{r['load_s']:>8}{r['plan_latency_ms_p50']:>9}"
+              f"{r['plan_latency_ms_mean']:>9}{r['tokens_per_sec']:>8}{accept:>8}{r['peak_rss_mb']:>9}{r['exact_match']:>7}{r['token_jaccard']:>9}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/clarify.py — Clarifying Questions: Model Round-trip vs. Clarifier
+# Times the answer to vague short first turns two ways:
+#   model      the original path: safe_generate("Ask user for details about ...", 30)
+#              per input, with the old filter falling back to a fixed question
+#   clarifier  Clarifier.question: canned / templated on first sight, cached after
+# Also reports how many model questions the filter threw away.
+#
+# Usage: python -m benchmarks.clarify [--backend eager] [--inputs 40]
+
+import argparse
+import os
+import time
+
+INPUTS = [
+    "help", "hello", "ok", "knitting", "my garden", "crypto", "taxes", "career change", "stress",
+    "sleep", "moving abroad", "wedding", "public speaking", "my startup", "novel", "guitar",
+    "side hustle", "dating", "burnout", "retirement",
+]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=os.environ.get("LBA_BACKEND", "mock"))
+    parser.add_argument("--inputs", type=int, default=40, help="inputs per run (cycled from a fixed list)")
+    args = parser.parse_args()
+    os.environ["LBA_BACKEND"] = args.backend
+    os.environ.setdefault("LBA_WARMUP_BATCH_SIZE", "1")
+
+    import logging
+    logging.disable(logging.INFO)
+    import clarifier
+    import model
+
+    brain = model.LifeGuideAI()
+    texts = [INPUTS[i % len(INPUTS)] for i in range(args.inputs)]
+
+    start = time.perf_counter()
+    discarded = 0
+    for t in texts:
+        q = brain.safe_generate(clarifier.prompt_for(t), 30)
+        if "question" in q.lower() or len(q) < 5: discarded += 1
+    model_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    c = clarifier.Clarifier(generate=None)
+    start = time.perf_counter()
+    for t in texts: c.question(t)
+    cold_ms = (time.perf_counter() - start) / len(texts) * 1000
+    for t in texts: c.put(t, c.question(t))
+    start = time.perf_counter()
+    for t in texts: c.question(t)
+    warm_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    print(f"backend={args.backend}  inputs={len(texts)}")
+    print(f"  model       {model_ms:10.3f} ms/question  ({discarded}/{len(texts)} discarded by the filter)")
+    print(f"  clarifier   {cold_ms:10.3f} ms/question  (canned/templated)")
+    print(f"  cached      {warm_ms:10.3f} ms/question")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/distill_eval.py — Teacher vs. Distilled Student
+# Generates plans for held-out problems with the teacher (LBA_MODEL, by
+# default flan-t5-base) and a student checkpoint from `train.py --distill`,
+# through the serving path minus lookups (no knowledge base, no plan cache):
+# LifeGuideAI.generate_outputs + build_plan, one problem at a time, greedy.
+# Per plan field:
+#   exact  share of problems where both models give the same text (case and spacing ignored)
+#   f1     word-overlap F1 between the two texts
+# Per model: plan latency p50 / p95 and the student's speedup.
+#
+# Usage: python -m benchmarks.distill_eval --student ./distilled_model [--teacher google/flan-t5-base] [--problems held_out.txt]
+
+import argparse
+import os
+import re
+import time
+from collections import Counter
+
+# Not in fixtures/train_tiny.jsonl, so not seen by a student distilled on the default problems
+HELD_OUT = [
+    "learn to cook healthy meals on a budget", "pay off my credit card debt", "write my thesis introduction",
+    "prepare for a marathon in six months", "stop doom-scrolling before bed", "find a new job in data analysis",
+    "make friends after moving to a new city", "plan a two-week trip to Japan", "practice piano every day",
+    "reduce stress during exam season", "start a vegetable garden on my balcony", "save for a house deposit",
+    "get my small business online", "learn to drive before summer", "read twelve books this year",
+    "repair my relationship with my brother",
+]
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+def f1(a: str, b: str) -> float:
+    wa, wb = words(a), words(b)
+    if not wa or not wb: return float(wa == wb)
+    common = sum((Counter(wa) & Counter(wb)).values())
+    if not common: return 0.0
+    precision, recall = common / len(wb), common / len(wa)
+    return 2 * precision * recall / (precision + recall)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def read_problems(path):
+    import bulk
+    problems = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                problem = bulk.parse_problem(line)
+            except ValueError:
+                problem = line.strip()  # plain text line
+            if problem: problems.append(problem)
+    return problems
+
+def run(brain, problems):
+    outputs, seconds = [], []
+    for problem in problems:
+        start = time.perf_counter()
+        out = brain.generate_outputs(problem)
+        brain.build_plan(problem, out)
+        seconds.append(time.perf_counter() - start)
+        outputs.append(out)
+    return outputs, seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--student", required=True, help="checkpoint dir from train.py --distill")
+    parser.add_argument("--teacher", help="default: LBA_MODEL (google/flan-t5-base)")
+    parser.add_argument("--problems", help="file of problems, one per line (text or bulk.py JSONL); default: a built-in held-out set")
+    args = parser.parse_args()
+    os.environ.setdefault("LBA_WARMUP_BATCH_SIZE", "8")
+
+    import logging
+    logging.disable(logging.INFO)
+    import model
+
+    problems = read_problems(args.problems) if args.problems else HELD_OUT
+    teacher_id = args.teacher or model.LifeGuideAI.MODEL_ID
+    results = {}
+    for name, model_id in (("teacher", teacher_id), ("student", args.student)):
+        brain = model.LifeGuideAI(deterministic=True, model_id=model_id)
+        if not brain.available: raise SystemExit(f"Could not load {name} model {model_id}.")
+        results[name] = run(brain, problems)
+
+    (teacher_out, teacher_s), (student_out, student_s) = results["teacher"], results["student"]
+    print(f"teacher={teacher_id}  student={args.student}  problems={len(problems)}")
+    print(f"  {'field':<26} {'exact':>6} {'f1':>6}")
+    all_exact, all_f1 = [], []
+    for i, (field, slot, _, _) in enumerate(model.PLAN_PROMPTS):
+        pairs = [(t[i], s[i]) for t, s in zip(teacher_out, student_out)]
+        exact = [float(words(t) == words(s)) for t, s in pairs]
+        overlap = [f1(t, s) for t, s in pairs]
+        all_exact += exact
+        all_f1 += overlap
+        label = f"{field}.{slot}" if slot else field
+        print(f"  {label:<26} {sum(exact) / len(exact):6.1%} {sum(overlap) / len(overlap):6.2f}")
+    print(f"  {'all fields':<26} {sum(all_exact) / len(all_exact):6.1%} {sum(all_f1) / len(all_f1):6.2f}")
+    print("latency per plan:")
+    for name, seconds in (("teacher", teacher_s), ("student", student_s)):
+        print(f"  {name:<8} p50 {percentile(seconds, 0.5) * 1000:8.1f} ms   p95 {percentile(seconds, 0.95) * 1000:8.1f} ms")
+    print(f"  speedup  {percentile(teacher_s, 0.5) / percentile(student_s, 0.5):.2f}x (p50)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/find_template.py — Keyword Index vs. Original Loop
+# Builds a synthetic knowledge base of N topics x K keywords and times
+# find_template with the compiled index against the original nested loop.
+#
+# Usage: python -m benchmarks.find_template --topics 2000 --keywords 10
+
+import argparse
+import random
+import string
+import time
+
+from knowledge_base import KeywordIndex
+
+def legacy_find_template(templates, text):
+    """The original implementation: every topic, every keyword, substring test."""
+    text_lower = text.lower()
+    for key, data in templates.items():
+        if key == "general": continue
+        for kw in data["keywords"]:
+            if kw in text_lower:
+                return data
+    return None
+
+def make_templates(n_topics, n_keywords, rng):
+    word = lambda: "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+    return {f"topic_{i}": {"keywords": [word() for _ in range(n_keywords)]} for i in range(n_topics)}
+
+def make_queries(templates, n, rng):
+    """Half hit a random keyword, half are misses (the loop's worst case)."""
+    keywords = [kw for data in templates.values() for kw in data["keywords"]]
+    filler = "i need a plan to get my life in order this week please".split()
+    queries = []
+    for i in range(n):
+        words = rng.sample(filler, 6)
+        if i % 2 == 0: words.insert(3, rng.choice(keywords))
+        queries.append(" ".join(words))
+    return queries
+
+def bench(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries: fn(q)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--keywords", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    templates = make_templates(args.topics, args.keywords, rng)
+    queries = make_queries(templates, args.queries, rng)
+
+    start = time.perf_counter()
+    index = KeywordIndex(templates)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    legacy_us = bench(lambda q: legacy_find_template(templates, q), queries, args.repeat)
+    index_us = bench(index.best, queries, args.repeat)
+
+    print(f"{args.topics} topics x {args.keywords} keywords, {len(queries)} queries")
+    print(f"index build:  {build_ms:.1f} ms (once at load)")
+    print(f"legacy loop:  {legacy_us:.1f} us/query")
+    print(f"keyword index: {index_us:.1f} us/query ({legacy_us / index_us:.1f}x speedup)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/generation_modes.py — Field-by-field vs. Single-pass Plans
+# Generates a plan for each problem in both modes with greedy decoding and
+# reports per-plan latency next to simple quality signals:
+#   parsed      share of sections the structured parser recovered (no per-field fallback)
+#   defaults    share of list fields that fell back to the canned defaults
+#   overlap     token Jaccard between the two modes' plans, per section
+#
+# Usage: python -m benchmarks.generation_modes [--backend int8] [--out modes.json]
+
+import argparse
+import json
+import statistics
+import time
+
+PROBLEMS = [
+    "I keep putting off my tax return",
+    "I want to move to a new city next month",
+    "My inbox has 3000 unread emails",
+    "I need to prepare for a job interview on Friday",
+    "I want to write a short novel this year",
+    "My garden is overgrown and I don't know where to start",
+]
+
+def sections(plan):
+    return [", ".join(plan.root_causes), ", ".join(plan.steps)] + list(plan.timeline.values()) + list(plan.action_plan_24h.values())
+
+def jaccard(a, b):
+    ta, tb = set(a.lower().split()), set(b.lower().split())
+    return len(ta & tb) / len(ta | tb) if ta | tb else 1.0
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=None, help="overrides LBA_BACKEND")
+    parser.add_argument("--out", help="optional JSON report path")
+    args = parser.parse_args()
+
+    import config
+    if args.backend: config.BACKEND = args.backend
+    import model
+
+    brain = model.LifeGuideAI(deterministic=True)
+    if not brain.available:
+        raise SystemExit("Model failed to load; a comparison needs the real model.")
+    brain.plan_cache = None  # measure generation, not cache hits
+
+    report = {}
+    plans = {}
+    for mode in ("fields", "structured"):
+        brain.generation_mode = mode
+        latencies, parsed, defaults = [], [], []
+        plans[mode] = []
+        for problem in PROBLEMS:
+            if mode == "structured":
+                raw = brain.safe_generate(model.STRUCTURED_PROMPT.format(problem=problem), model.STRUCTURED_MAX_TOKENS)
+                parsed.append(len(model.parse_structured(raw)) / len(model.PLAN_PROMPTS))
+            start = time.perf_counter()
+            plan = brain.build_plan(problem, brain.generate_outputs(problem))
+            latencies.append(time.perf_counter() - start)
+            defaults.append(sum(getattr(plan, f) == d for f, d in model.LIST_FALLBACKS.items()) / len(model.LIST_FALLBACKS))
+            plans[mode].append(plan)
+        report[mode] = {
+            "plan_latency_ms_p50": round(statistics.median(latencies) * 1000, 1),
+            "plan_latency_ms_mean": round(statistics.mean(latencies) * 1000, 1),
+            "list_defaults_rate": round(statistics.mean(defaults), 3),
+        }
+        if parsed: report[mode]["parsed_rate"] = round(statistics.mean(parsed), 3)
+
+    report["section_overlap"] = round(statistics.mean(
+        jaccard(a, b) for pf, ps in zip(plans["fields"], plans["structured"]) for a, b in zip(sections(pf), sections(ps))
+    ), 3)
+    report["speedup"] = round(report["fields"]["plan_latency_ms_mean"] / report["structured"]["plan_latency_ms_mean"], 2)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"report": report, "plans": {m: [p.model_dump() for p in ps] for m, ps in plans.items()}}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
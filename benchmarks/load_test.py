@@ -0,0 +1,177 @@
+# benchmarks/load_test.py — /chat Throughput and Tail Latency
+# Replays a fixed mix of template hits, ambiguous inputs and model-fallback
+# problems against app.py at several concurrency levels, using the mock
+# backend (no network, no model download). Reports p50/p95/p99 latency,
+# requests/sec and peak RSS per level as JSON, so releases can be diffed.
+#
+# Usage:
+#   python -m benchmarks.load_test                        # in-process (ASGI transport)
+#   python -m benchmarks.load_test --transport http       # real uvicorn server on a free port
+#   python -m benchmarks.load_test --concurrency 1,8,32 --requests 400 --token-delay-ms 2 --out load.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+# (kind, first user message); weights below decide how often each kind is sent
+WORKLOAD = {
+    "template": [
+        "Guide me to learn Python from scratch.",
+        "I want to start going to the gym but I have no motivation.",
+        "How do I plan a surprise birthday party for my friend?",
+        "I need a plan to clean my entire house in 4 hours on Saturday.",
+    ],
+    "ambiguous": ["Help me", "taxes", "moving abroad", "Help"],
+    "model": [
+        "I keep putting off my tax return every single year",
+        "I want to move to a new city next month and feel lost",
+        "My inbox has 3000 unread emails and I am drowning",
+        "I need to prepare for a job interview on Friday morning",
+    ],
+}
+DEFAULT_MIX = "template=0.5,ambiguous=0.2,model=0.3"
+
+def make_requests(n, mix, seed=0):
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    out = []
+    for _ in range(n):
+        kind = rng.choices(kinds, weights)[0]
+        text = rng.choice(WORKLOAD[kind])
+        out.append((kind, {"conversation_history": [{"role": "user", "content": text}]}))
+    return out
+
+def percentile(sorted_values, p):
+    if not sorted_values: return None
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[k] * 1000, 2)
+
+async def run_level(client, requests, concurrency):
+    queue = list(requests)
+    latencies, by_kind, statuses = [], {}, {}
+
+    async def worker():
+        while queue:
+            kind, body = queue.pop()
+            start = time.perf_counter()
+            r = await client.post("/chat", json=body)
+            elapsed = time.perf_counter() - start
+            statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            latencies.append(elapsed)
+            by_kind.setdefault(kind, []).append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    summarize = lambda values: {f"p{p}_ms": percentile(sorted(values), p) for p in (50, 95, 99)}
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / wall, 1),
+        **summarize(latencies),
+        "by_kind": {k: {"count": len(v), **summarize(v)} for k, v in sorted(by_kind.items())},
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+def rss_mb(pid=None):
+    """Peak RSS in MB: this process via getrusage, another via /proc (Linux)."""
+    if pid is None:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(client, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/readyz")).status_code == 200: return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready in time.")
+
+async def main_async(args):
+    mix = {k: float(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+    levels = [int(c) for c in args.concurrency.split(",")]
+    timeout = httpx.Timeout(120)
+    results, server, server_pid = [], None, None
+
+    if args.transport == "inprocess":
+        import app
+        app.brain.start(background=False)  # ASGITransport does not run the lifespan hook
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench", timeout=timeout)
+    else:
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+            env=os.environ.copy(),
+        )
+        server_pid = server.pid
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=timeout)
+
+    try:
+        await wait_ready(client)
+        await run_level(client, make_requests(min(20, args.requests), mix, seed=99), 4)  # warm the path
+        for level in levels:
+            result = await run_level(client, make_requests(args.requests, mix), level)
+            result["peak_rss_mb"] = rss_mb(server_pid)
+            print(f"c={level:<4} rps={result['rps']:<8} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"p99={result['p99_ms']}ms rss={result['peak_rss_mb']}MB")
+            results.append(result)
+    finally:
+        await client.aclose()
+        if server:
+            server.terminate()
+            server.wait()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weights per kind, e.g. template=0.5,ambiguous=0.2,model=0.3")
+    parser.add_argument("--token-delay-ms", type=float, default=1.0, help="mock backend decode time per token")
+    parser.add_argument("--out", default="load_test.json")
+    args = parser.parse_args()
+
+    # Set before app/config are imported here, and inherited by the uvicorn child
+    os.environ["LBA_BACKEND"] = "mock"
+    os.environ["LBA_MOCK_TOKEN_DELAY_MS"] = str(args.token_delay_ms)
+    os.environ.setdefault("LBA_WARMUP_BATCH_SIZE", "0")
+
+    results = asyncio.run(main_async(args))
+    report = {
+        "transport": args.transport,
+        "mix": args.mix,
+        "token_delay_ms": args.token_delay_ms,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "levels": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
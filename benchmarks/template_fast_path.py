@@ -0,0 +1,94 @@
+# benchmarks/template_fast_path.py — Knowledge-base Hit Response Cost
+# Per-request cost of answering a template hit three ways:
+#   validated  FinalPlan(**template) in a ChatResponse, validated and encoded
+#              by FastAPI via response_model (the original /chat path)
+#   copied     pre-validated plan copied with the problem, model_dump_json
+#   spliced    pre-encoded bytes with the problem spliced in (current /chat)
+# "build" times only the response construction; "http" times whole requests
+# through FastAPI in-process (ASGI, no network), one at a time.
+# All three produce the same JSON document; that is checked first.
+#
+# Usage: python -m benchmarks.template_fast_path [--requests 2000]
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+def bench(fn, args, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for a in args: fn(a)
+    return (time.perf_counter() - start) / (repeat * len(args)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000, help="requests per variant in the http run")
+    parser.add_argument("--repeat", type=int, default=200, help="passes over the problems in the build run")
+    args = parser.parse_args()
+    os.environ.setdefault("LBA_BACKEND", "mock")
+
+    import logging
+    logging.disable(logging.INFO)
+    import httpx
+    from fastapi import FastAPI
+    from fastapi.responses import Response
+    import app
+    import model
+
+    kb = model.KNOWLEDGE.current
+    problems = [f"{text} #{i}" for i in range(50) for text in (
+        "Guide me to learn Python from scratch", "I want to start going to the gym",
+        "Plan a surprise birthday party", "I need to clean my entire house",
+    )]
+    topics = {p: app.brain.find_topic(p, kb) for p in problems}
+
+    def validated(p):
+        # What FastAPI does with response_model: build, re-validate, dump to python, json.dumps
+        resp = app.ChatResponse(type='plan', plan=model.FinalPlan(**kb.templates[topics[p]], problem=p))
+        return json.dumps(app.ChatResponse.model_validate(resp.model_dump()).model_dump(mode="json")).encode()
+    def copied(p):
+        return app.ChatResponse(type='plan', plan=kb.plans[topics[p]].model_copy(update={"problem": p})).model_dump_json().encode()
+    def spliced(p):
+        return app.template_response_json(kb.plan_json(topics[p], p))
+    variants = {"validated": validated, "copied": copied, "spliced": spliced}
+
+    for p in problems[:8]:
+        docs = [json.loads(fn(p)) for fn in variants.values()]
+        assert all(d == docs[0] for d in docs), f"variants disagree for {p!r}"
+
+    print("build (response construction only, lookup excluded):")
+    build = {name: bench(fn, problems, args.repeat) for name, fn in variants.items()}
+    for name, us in build.items():
+        print(f"  {name:<10} {us:8.2f} us/request  ({build['validated'] / us:5.1f}x)")
+
+    # Whole requests: lookup + response, through FastAPI's routing and (for 'validated') response_model handling
+    bench_app = FastAPI()
+    @bench_app.post("/validated", response_model=app.ChatResponse)
+    def validated_route(body: dict):
+        p = body["problem"]
+        return app.ChatResponse(type='plan', plan=model.FinalPlan(**app.brain.find_template(p), problem=p))
+    @bench_app.post("/copied")
+    def copied_route(body: dict):
+        return Response(app.ChatResponse(type='plan', plan=app.brain.template_plan(body["problem"])).model_dump_json(), media_type="application/json")
+    @bench_app.post("/spliced")
+    def spliced_route(body: dict):
+        return Response(app.template_response_json(app.brain.template_json(body["problem"])), media_type="application/json")
+
+    async def run(path):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=bench_app), base_url="http://bench") as client:
+            for p in problems[:20]: await client.post(path, json={"problem": p})  # warm
+            start = time.perf_counter()
+            for i in range(args.requests):
+                r = await client.post(path, json={"problem": problems[i % len(problems)]})
+                assert r.status_code == 200
+            return (time.perf_counter() - start) / args.requests * 1e6
+
+    print("http (in-process ASGI, sequential, includes client overhead):")
+    http = {name: asyncio.run(run("/" + name)) for name in variants}
+    for name, us in http.items():
+        print(f"  {name:<10} {us:8.1f} us/request  (saves {http['validated'] - us:6.1f} us)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/train_pipeline.py — Training Data Pipeline Cost
+# Runs train.py's pipeline on the bundled fixture, repeated to --rows rows,
+# with the offline tiny model (no downloads) unless --model is given:
+#   tokenize   cold with one process, cold with --num-proc, then from the cache
+#   padding    share of padding tokens per epoch: every row padded to the max
+#              length (the original setup), dynamic padding of random batches,
+#              and dynamic padding of length-grouped batches (train.py)
+#   train      with --steps N: optimizer steps/sec, random vs length-grouped
+#
+# Usage: python -m benchmarks.train_pipeline [--rows 20000] [--num-proc 4] [--steps 50]
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+def write_rows(path, rows, fixture):
+    with open(fixture, encoding="utf-8") as f:
+        base = [json.loads(line) for line in f if line.strip()]
+    with open(path, "w", encoding="utf-8") as out:
+        for i in range(rows):
+            row = base[i % len(base)]
+            out.write(json.dumps({"prompt": f"{row['prompt']} (case {i})", "completion": row["completion"]}) + "\n")
+
+def padding_share(sizes, batches, fixed=None):
+    """Padding tokens / all tokens fed to the model, for batches of row indices."""
+    real = padded = 0
+    for batch in batches:
+        width = fixed or max(sizes[i] for i in batch)
+        real += sum(sizes[i] for i in batch)
+        padded += width * len(batch)
+    return 1 - real / padded, padded
+
+def grouped_batches(sizes, batch_size, rng, mega=50):
+    """Like transformers' LengthGroupedSampler: shuffle, then sort within megabatches of 50 batches."""
+    order = list(range(len(sizes)))
+    rng.shuffle(order)
+    out = []
+    for start in range(0, len(order), mega * batch_size):
+        chunk = sorted(order[start:start + mega * batch_size], key=lambda i: -sizes[i])
+        out.extend(chunk[i:i + batch_size] for i in range(0, len(chunk), batch_size))
+    return out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--model", help="hub model id for a real tokenizer (default: offline tiny model)")
+    parser.add_argument("--steps", type=int, default=0, help="also time this many training steps per variant")
+    args = parser.parse_args()
+
+    import train
+
+    work = tempfile.mkdtemp(prefix="lba-train-bench-")
+    data = os.path.join(work, "data.jsonl")
+    write_rows(data, args.rows, train.FIXTURE)
+    base = ["--data-files", data, "--cache-dir", os.path.join(work, "cache"), "--output-dir", os.path.join(work, "out"),
+            "--batch-size", str(args.batch_size), "--eval-fraction", "0"]
+    base += ["--model", args.model] if args.model else ["--tiny-model"]
+
+    def prepare(num_proc, cache_dir):
+        targs = train.parse_args(base + ["--num-proc", str(num_proc), "--cache-dir", cache_dir])
+        ds = train.load_source(targs)
+        columns = train.find_columns(ds.column_names)
+        if args.model:
+            tokenizer = train.AutoTokenizer.from_pretrained(args.model)
+        else:
+            tokenizer, _ = train.tiny_model(train.sample_texts(ds, columns, False))
+        start = time.perf_counter()
+        tokenized = train.tokenize(ds, tokenizer, targs, columns)
+        return time.perf_counter() - start, tokenized, targs
+
+    print(f"rows={args.rows}  batch_size={args.batch_size}  tokenizer={args.model or 'tiny (word-level)'}")
+    single, _, _ = prepare(1, os.path.join(work, "cache-1"))
+    multi, tokenized, targs = prepare(args.num_proc, os.path.join(work, "cache-n"))
+    cached, _, _ = prepare(args.num_proc, os.path.join(work, "cache-n"))
+    print("tokenize:")
+    print(f"  1 process          {single:8.2f} s")
+    print(f"  {max(1, min(args.num_proc, args.rows // 2000)):<2} processes       {multi:8.2f} s")
+    print(f"  cached             {cached:8.2f} s")
+
+    rng = random.Random(0)
+    src = list(tokenized["length"])
+    tgt = [len(ids) for ids in tokenized["labels"]]
+    order = list(range(len(src)))
+    rng.shuffle(order)
+    random_batches = [order[i:i + args.batch_size] for i in range(0, len(order), args.batch_size)]
+    variants = {
+        "fixed max length": (random_batches, targs.max_source_length, targs.max_target_length),
+        "dynamic, random": (random_batches, None, None),
+        "dynamic, grouped": (grouped_batches(src, args.batch_size, rng), None, None),
+    }
+    print("padding (source / target share of tokens that are padding, tokens per epoch):")
+    for name, (batches, fixed_src, fixed_tgt) in variants.items():
+        s_share, s_tokens = padding_share(src, batches, fixed_src)
+        t_share, t_tokens = padding_share(tgt, batches, fixed_tgt)
+        print(f"  {name:<18} {s_share:6.1%} / {t_share:6.1%}   {s_tokens + t_tokens:>12,}")
+
+    if args.steps:
+        print("train:")
+        for name, extra in (("random", ["--no-group-by-length"]), ("grouped", [])):
+            trainer = train.train(base + ["--max-steps", str(args.steps), "--no-train"] + extra)
+            start = time.perf_counter()
+            trainer.train()
+            print(f"  {name:<18} {args.steps / (time.perf_counter() - start):8.2f} steps/s")
+
+if __name__ == "__main__":
+    main()
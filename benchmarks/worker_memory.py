@@ -0,0 +1,104 @@
+# benchmarks/worker_memory.py — Memory per Worker under serve.py
+# Starts serve.py with 1, 2, 4... workers and sums memory over the parent and
+# its workers once all are ready. PSS (proportional set size) splits each
+# shared page between the processes mapping it, so its total is the real
+# footprint; summed RSS counts shared weights once per process.
+# Fails (exit 1) unless total PSS grows sublinearly with the worker count: each
+# worker beyond the first must add less than --max-extra-ratio of the
+# single-worker footprint (unshared weights would add about half of it).
+#
+# Usage:
+#   python -m benchmarks.worker_memory                          # mock backend with a 512 MB weight buffer
+#   python -m benchmarks.worker_memory --backend int8 --workers 1,2,4
+# Linux only (/proc/<pid>/smaps_rollup).
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import free_port
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def memory_kb(pid):
+    """(Pss, Rss) in KiB from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Pss", "Rss"): values[key] = int(rest.split()[0])
+    return values["Pss"], values["Rss"]
+
+def wait_workers_ready(port, workers, timeout):
+    """Polls /readyz until `workers` distinct worker pids have reported ready."""
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and len(seen) < workers:
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+                r = client.get("/readyz")
+                if r.status_code == 200: seen.add(r.json().get("pid"))
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    if len(seen) < workers:
+        raise RuntimeError(f"Only {len(seen)}/{workers} workers became ready.")
+
+def measure(workers, timeout):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_workers_ready(port, workers, timeout)
+        time.sleep(1)  # let warmup allocations settle
+        pids = [server.pid] + children(server.pid)
+        pss, rss = map(sum, zip(*(memory_kb(p) for p in pids)))
+        return {"workers": workers, "processes": len(pids), "pss_mb": round(pss / 1024, 1), "rss_mb": round(rss / 1024, 1)}
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--backend", default="mock")
+    parser.add_argument("--mock-weights-mb", type=int, default=512, help="mock backend only: simulated weight size")
+    parser.add_argument("--max-extra-ratio", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", help="optional JSON report path")
+    args = parser.parse_args()
+
+    os.environ["LBA_BACKEND"] = args.backend
+    os.environ["LBA_MOCK_WEIGHTS_MB"] = str(args.mock_weights_mb)
+    os.environ.setdefault("LBA_WARMUP_BATCH_SIZE", "1")
+
+    results = [measure(int(n), args.timeout) for n in args.workers.split(",")]
+    base = results[0]
+    print(f"{'workers':>8}{'procs':>7}{'PSS MB':>10}{'RSS MB':>10}{'PSS/worker':>12}")
+    for r in results:
+        # Marginal cost of each worker beyond the first, relative to the first
+        r["pss_per_extra_worker_mb"] = round((r["pss_mb"] - base["pss_mb"]) / (r["workers"] - base["workers"]), 1) if r is not base else None
+        print(f"{r['workers']:>8}{r['processes']:>7}{r['pss_mb']:>10}{r['rss_mb']:>10}{round(r['pss_mb'] / r['workers'], 1):>12}")
+
+    limit = base["pss_mb"] * args.max_extra_ratio
+    sublinear = all(r["pss_per_extra_worker_mb"] < limit for r in results[1:])
+    print("PSS grows sublinearly with workers." if sublinear else f"FAIL: a worker adds >= {limit:.1f} MB (weights are not shared).")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"backend": args.backend, "levels": results, "sublinear": sublinear}, f, indent=2)
+    sys.exit(0 if sublinear else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# bulk.py — Bulk / Offline Plan Generation
+# Turns a stream of problems into a stream of plans, in input order, with a
+# bounded number in flight (the window) so memory stays flat however long
+# the input is. Knowledge-base hits are answered inline; misses run through
+# the remaining lookups and the model on a thread pool, where the
+# micro-batcher merges the prompts of concurrent misses into shared model
+# batches. Given an Admission (the server's), model work takes background
+# slots, so bulk load counts against /chat's degrade decisions.
+# Used by POST /chat/batch (app.py) and by the CLI:
+#
+#   python bulk.py problems.jsonl --out plans.jsonl [--window 64]
+#
+# Input lines are a JSON string, {"problem": "..."} or {"conversation_history": [...]}.
+# Output has exactly one line per input problem: the FinalPlan JSON, or
+# {"error": "..."} for a line that could not be read or planned. Re-running the same
+# command resumes: problems already written to --out are skipped.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+def parse_problem(line) -> Optional[str]:
+    """Problem text from one input line; None for blank lines. Raises ValueError if unreadable."""
+    line = line.strip()
+    if not line: return None
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if isinstance(item, dict) and isinstance(item.get("conversation_history"), list):
+        item = " ".join(m.get("content", "") for m in item["conversation_history"] if m.get("role") == "user")
+    elif isinstance(item, dict):
+        item = item.get("problem")
+    if not isinstance(item, str) or not item.strip():
+        raise ValueError("expected a string, {\"problem\": ...} or {\"conversation_history\": [...]}")
+    return item.strip()
+
+def error_line(message: str) -> str:
+    return json.dumps({"error": message})
+
+class BulkPlanner:
+    """Submits problems for planning; template hits come back as already-finished futures (pre-encoded JSON)."""
+
+    def __init__(self, brain, window: int = 64, admission=None):
+        self.brain = brain
+        self.window = window
+        self.admission = admission
+        # One thread per in-flight miss: each blocks in plan() while its prompts wait to be batched
+        self.pool = ThreadPoolExecutor(max_workers=window, thread_name_prefix="bulk")
+
+    def submit(self, problem: str, cancel: Optional[threading.Event] = None) -> Future:
+        plan_json = self.brain.template_json(problem)
+        if plan_json:
+            metrics.BULK_ITEMS.inc(source="template")
+            done = Future()
+            done.set_result(plan_json.decode("utf-8"))
+            return done
+        metrics.BULK_ITEMS.inc(source="model")
+        return self.pool.submit(self.plan, problem, cancel)
+
+    def plan(self, problem: str, cancel: Optional[threading.Event] = None):
+        """A keyword miss: embeddings and the plan cache, then the model (in a background admission slot)."""
+        plan = self.brain.retrieve_plan(problem)
+        if plan: return plan
+        if self.admission is None: return self.brain.generate_plan(problem, cancel)
+        with self.admission.slot(background=True, cancel=cancel):
+            return self.brain.generate_plan(problem, cancel)
+
+    def submit_error(self, message: str) -> Future:
+        """Unreadable input still gets its output line, so output stays aligned with input."""
+        metrics.BULK_ITEMS.inc(source="error")
+        done = Future()
+        done.set_result(error_line(message))
+        return done
+
+    def lines(self, raw_lines: Iterable, skip: int = 0) -> Iterator[str]:
+        """
+        One output line per input problem, in input order, keeping at most
+        `window` problems in flight. The first `skip` problems are not planned
+        (used to resume). Raw lines may be str or bytes.
+        """
+        in_flight = deque()
+        cancel = threading.Event()
+        count = 0
+        try:
+            for raw in raw_lines:
+                try:
+                    problem, error = parse_problem(raw), None
+                except ValueError as e:
+                    problem, error = "", str(e)
+                if problem is None: continue
+                count += 1
+                if count <= skip: continue
+                if len(in_flight) >= self.window: yield self.result_line(in_flight.popleft())
+                in_flight.append(self.submit_error(error) if error else self.submit(problem, cancel))
+            while in_flight:
+                yield self.result_line(in_flight.popleft())
+        finally:
+            # Abandoned early (e.g. client disconnect): withdraw whatever has not run yet
+            cancel.set()
+            for future in in_flight: future.cancel()
+
+    def result_line(self, future: Future) -> str:
+        """A failed problem gets an error line instead of ending the whole stream."""
+        try:
+            return self.to_line(future.result())
+        except Exception as e:
+            logger.error(f"Bulk plan failed: {e}")
+            metrics.GENERATION_ERRORS.inc(source="bulk")
+            return error_line(f"plan failed: {e}")
+
+    @staticmethod
+    def to_line(result) -> str:
+        """A FinalPlan as JSON; template hits and error lines are already strings."""
+        return result if isinstance(result, str) else result.model_dump_json()
+
+def completed_lines(path: str) -> int:
+    """Complete lines already in an output file. A trailing partial line (interrupted write) is cut off."""
+    if not os.path.exists(path): return 0
+    count, end, offset = 0, 0, 0
+    with open(path, "rb+") as f:
+        # Chunked, so resuming a huge output file does not load it into memory
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            count += chunk.count(b"\n")
+            if b"\n" in chunk: end = offset + chunk.rfind(b"\n") + 1
+            offset += len(chunk)
+        if end < offset: f.truncate(end)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate plans for a JSONL file of problems.")
+    parser.add_argument("input", help="JSONL file of problems")
+    parser.add_argument("--out", required=True, help="JSONL file of plans (appended to when resuming)")
+    parser.add_argument("--window", type=int, default=config.BULK_WINDOW, help="problems in flight at once")
+    parser.add_argument("--restart", action="store_true", help="ignore existing output instead of resuming")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    skip = 0 if args.restart else completed_lines(args.out)
+    if skip: print(f"Resuming after {skip} completed problems.")
+
+    import model
+    brain = model.LifeGuideAI()
+    planner = BulkPlanner(brain, args.window)
+    written = 0
+    with open(args.input, encoding="utf-8") as src, open(args.out, "w" if args.restart else "a", encoding="utf-8") as out:
+        try:
+            for line in planner.lines(src, skip=skip):
+                # Flushed per line so an interruption loses at most the plans still in flight
+                out.write(line + "\n")
+                out.flush()
+                written += 1
+        except KeyboardInterrupt:
+            sys.exit(f"Interrupted after {skip + written} problems; run the same command again to resume.")
+    print(f"Wrote {written} plans to {args.out} ({skip + written} total).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# clarifier.py — Clarifying Questions for Short Inputs
+# A first turn of one or two words that matches no template is too vague to
+# plan, so the reply is a question. Questions come from, in order:
+#   cache       normalized input -> question; bounded LRU, seeded from an
+#               optional JSON file built offline and filled by generations
+#   classifier  word lists pick a canned question for greetings, requests
+#               for help and acknowledgements; anything else names a subject
+#               and gets a templated question about it
+# A request never waits on the model. For subjects, a model-written question
+# can be generated in the background (one at a time, bounded backlog) and
+# cached, so the next user typing the same thing gets it.
+#
+# Build a seed file offline (LBA_CLARIFY_PATH) from a list of inputs, one per line:
+#   python clarifier.py inputs.txt --out clarifications.json
+
+import argparse
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CANNED = {
+    "help": "I'm here to help. What specific goal are we planning today?",
+    "greeting": "Hi! What goal or problem would you like to break down today?",
+    "ack": "What would you like to plan? For example: 'get fit in 3 months' or 'learn Python'.",
+}
+GREETINGS = {"hi", "hello", "hey", "hiya", "yo", "hola", "greetings", "morning", "evening", "sup"}
+ACKS = {"yes", "no", "ok", "okay", "sure", "thanks", "thank", "you", "maybe", "idk", "hmm", "please", "what", "why"}
+
+def normalize(text: str) -> str:
+    """Case, punctuation and spacing removed: 'Help me!!' and 'help  me' share one entry."""
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+def classify(text: str) -> str:
+    """'help', 'greeting', 'ack' (all answered with a canned question) or 'subject'."""
+    key = normalize(text)
+    words = key.split()
+    if "help" in key: return "help"
+    if not words or all(w in ACKS for w in words): return "ack"
+    if words[0] in GREETINGS: return "greeting"
+    return "subject"
+
+def subject_question(text: str) -> str:
+    subject = text.strip().strip(".!?,;:").strip()
+    return f"What would you like to achieve with {subject}? A sentence about your goal or situation is enough."
+
+def prompt_for(text: str) -> str:
+    return f"Ask user for details about '{text}'. Question:"
+
+def accept(generated: Optional[str]) -> Optional[str]:
+    """A generated question worth keeping, or None (fallback strings, echoes of the prompt, non-questions)."""
+    q = (generated or "").strip()
+    if len(q) < 5 or "?" not in q or "question" in q.lower(): return None
+    return q
+
+class Clarifier:
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None,
+                 generate: Optional[Callable[[str], Optional[str]]] = None, max_pending: int = 64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # normalized input -> question; most recently used last
+        self.lock = threading.Lock()
+        self.generate = generate
+        self.max_pending = max_pending
+        self.pending = set()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clarify") if generate else None
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.evictions = 0
+        if path: self.load(path)
+
+    def load(self, path: str):
+        """Seeds the cache from a JSON mapping of input -> question."""
+        with open(path, encoding="utf-8") as f:
+            for text, question in json.load(f).items():
+                self.put(text, question)
+        logger.info(f"Loaded {len(self.entries)} clarifying questions from {path}")
+
+    def put(self, text: str, question: str):
+        key = normalize(text)
+        with self.lock:
+            self.entries[key] = question
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def question(self, text: str) -> str:
+        """The clarifying question for a short input; answered without waiting on the model."""
+        key = normalize(text)
+        with self.lock:
+            q = self.entries.get(key)
+            if q is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.CLARIFY_QUESTIONS.inc(source="cache")
+                return q
+            self.misses += 1
+        kind = classify(text)
+        metrics.CLARIFY_QUESTIONS.inc(source="canned" if kind in CANNED else "templated")
+        if kind in CANNED: return CANNED[kind]
+        if self.generate: self._learn(key, text)
+        return subject_question(text)
+
+    def _learn(self, key: str, text: str):
+        with self.lock:
+            if key in self.pending or len(self.pending) >= self.max_pending: return
+            self.pending.add(key)
+        self.pool.submit(self._generate, key, text)
+
+    def _generate(self, key: str, text: str):
+        try:
+            generated = self.generate(prompt_for(text))
+            # Unusable output still caches the templated question, so the input is not retried
+            if generated is not None:
+                self.put(key, accept(generated) or subject_question(text))
+                with self.lock: self.learned += 1
+        except Exception as e:
+            logger.warning(f"Clarifying question generation failed: {e}")
+        finally:
+            with self.lock: self.pending.discard(key)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "learned": self.learned,
+                "pending": len(self.pending),
+                "evictions": self.evictions,
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate clarifying questions for short inputs offline.")
+    parser.add_argument("input", help="text file, one short input per line")
+    parser.add_argument("--out", required=True, help="JSON file of input -> question (set LBA_CLARIFY_PATH to it)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    import model
+    brain = model.LifeGuideAI()
+    with open(args.input, encoding="utf-8") as f:
+        texts = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    subjects = [t for t in texts if classify(t) == "subject"]
+    generated = brain.safe_generate_batch([(prompt_for(t), 30) for t in subjects])
+    questions = {t: accept(g) or subject_question(t) for t, g in zip(subjects, generated)}
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(questions, f, indent=2, ensure_ascii=False)
+    kept = sum(accept(g) is not None for g in generated)
+    print(f"Wrote {len(questions)} questions to {args.out} ({kept} model-written, {len(texts) - len(subjects)} inputs have canned answers).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# config.py — Runtime Settings
+# Every knob is read once from the environment so deployments can tune
+# serving without code changes. Defaults match local development.
+
+import os
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+def _float(name, default):
+    return float(os.getenv(name, default))
+
+# --- Micro-batching Scheduler ---
+# Prompts from all in-flight requests are grouped into one model call.
+BATCH_MAX_SIZE = _int("LBA_BATCH_MAX_SIZE", 16)      # prompts per forward pass
+BATCH_MAX_WAIT_MS = _float("LBA_BATCH_MAX_WAIT_MS", 10)  # how long the first prompt waits for company
+
+# --- Async Inference ---
+INFERENCE_WORKERS = _int("LBA_INFERENCE_WORKERS", 4)        # threads allowed to wait on the model at once
+REQUEST_TIMEOUT_S = _float("LBA_REQUEST_TIMEOUT_S", 60)     # per-request budget for model work
+
+# --- Decoding & Plan Cache ---
+# Greedy decoding makes plans reproducible, which is what makes them cacheable.
+DETERMINISTIC = os.getenv("LBA_DETERMINISTIC", "0") == "1"
+PLAN_CACHE_SIZE = _int("LBA_PLAN_CACHE_SIZE", 1024)               # entries kept in memory
+PLAN_CACHE_TTL_S = _float("LBA_PLAN_CACHE_TTL_S", 24 * 3600)
+PLAN_CACHE_MAX_BYTES = _int("LBA_PLAN_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+PLAN_CACHE_PATH = os.getenv("LBA_PLAN_CACHE_PATH", "")            # SQLite file; empty = memory only
+
+# --- Knowledge Base ---
+KB_DIR = os.getenv("LBA_KB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge"))  # template files
+KB_RELOAD_S = _float("LBA_KB_RELOAD_S", 2)   # how often to check the files for changes; 0 disables hot reload
+
+# --- Semantic Retrieval ---
+# Built offline with `python retrieval.py build`; empty dir disables the stage.
+SEMANTIC_INDEX_DIR = os.getenv("LBA_SEMANTIC_INDEX_DIR", "")
+# Minimum cosine similarity for a hit; unset = the embedder's own, recorded in the index's meta.json
+SEMANTIC_THRESHOLD = float(os.environ["LBA_SEMANTIC_THRESHOLD"]) if os.getenv("LBA_SEMANTIC_THRESHOLD") else None
+SEMANTIC_TOP_K = _int("LBA_SEMANTIC_TOP_K", 3)
+
+# --- Model Lifecycle ---
+WARMUP_BATCH_SIZE = _int("LBA_WARMUP_BATCH_SIZE", 8)   # prompts in the warmup batch; 0 skips warmup
+
+# --- Inference Backend ---
+BACKEND = os.getenv("LBA_BACKEND", "eager")       # eager | int8 | compiled | assisted | mock
+MODEL_ID = os.getenv("LBA_MODEL", "google/flan-t5-base")  # hub id or local checkpoint dir, e.g. a student from train.py --distill
+TORCH_THREADS = _int("LBA_TORCH_THREADS", 0)      # intra-op threads; 0 keeps torch's default
+DRAFT_MODEL_ID = os.getenv("LBA_DRAFT_MODEL", "google/flan-t5-small")  # assisted backend: draft model (same tokenizer)
+DRAFT_TOKENS = _int("LBA_DRAFT_TOKENS", 5)          # assisted backend: tokens drafted per base-model pass (initial; adapts)
+ASSISTED_MAX_BATCH = _int("LBA_ASSISTED_MAX_BATCH", 8)  # assisted backend: larger batches use plain padded decoding
+MOCK_TOKEN_DELAY_MS = _float("LBA_MOCK_TOKEN_DELAY_MS", 1)  # mock backend only: simulated decode time per token
+MOCK_WEIGHTS_MB = _int("LBA_MOCK_WEIGHTS_MB", 0)             # mock backend only: resident buffer standing in for weights
+
+# --- Plan Generation Mode ---
+# fields: eight short prompts, one per plan field (batched)
+# structured: one prompt for the whole plan, parsed; unparsed fields fall back to their own prompt
+GENERATION_MODE = os.getenv("LBA_GENERATION_MODE", "fields")
+
+# --- Observability ---
+TIMING_HEADER = os.getenv("LBA_TIMING_HEADER", "0") == "1"   # add a Server-Timing header with per-stage durations
+
+# --- Bulk Generation (/chat/batch, bulk.py) ---
+BULK_WINDOW = _int("LBA_BULK_WINDOW", 64)   # problems in flight per bulk job; bounds memory and output reordering
+
+# --- Multi-worker Serving (serve.py) ---
+WORKERS = _int("LBA_WORKERS", 1)
+
+# --- Conversation Sessions ---
+SESSION_MAX = _int("LBA_SESSION_MAX", 10000)           # in-memory store: least recently active evicted beyond this
+SESSION_IDLE_S = _float("LBA_SESSION_IDLE_S", 1800)    # sessions idle longer than this expire
+SESSION_PATH = os.getenv("LBA_SESSION_PATH", "")       # SQLite file; shared by serve.py workers and kept across restarts
+
+# --- Admission Control ---
+MAX_IN_FLIGHT = _int("LBA_MAX_IN_FLIGHT", 256)                # chat requests in progress; beyond this new ones get 503
+ADMISSION_DEGRADE_AT = _int("LBA_ADMISSION_DEGRADE_AT", 32)   # plan requests queued for the model; beyond this answer with the general template
+SHED_RETRY_AFTER_S = _int("LBA_SHED_RETRY_AFTER_S", 2)        # Retry-After on shed requests
+
+# --- Clarifying Questions ---
+CLARIFY_CACHE_SIZE = _int("LBA_CLARIFY_CACHE_SIZE", 4096)   # short inputs -> questions kept in memory
+CLARIFY_PATH = os.getenv("LBA_CLARIFY_PATH", "")            # JSON seed file built with `python clarifier.py`
+CLARIFY_LEARN = os.getenv("LBA_CLARIFY_LEARN", "1") == "1"  # generate and cache model-written questions in the background
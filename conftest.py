@@ -0,0 +1,2 @@
+# benchmarks/ holds scripts, not tests: keeps a bare `pytest` from collecting load_test.py
+collect_ignore = ["benchmarks"]
@@ -1,94 +1,199 @@
 # knowledge_base.py
 # "Gold Standard" Templates to ground the AI.
+# Templates live as data in a directory (config.KB_DIR, default knowledge/):
+# JSON or YAML files, each mapping topic -> template. A template has the plan
+# fields of FinalPlan (everything except `problem`) plus its `keywords`.
+# Files load in name order and topics in file order; on equal keyword hits
+# the earlier topic wins. Each load is validated, compiled into a KeywordIndex
+# and pre-serialized, then swapped in whole, so edits go live without a restart.
 
-TOPIC_TEMPLATES = {
-    "coding": {
-        "keywords": ["code", "coding", "programming", "python", "javascript", "developer", "software"],
-        "root_causes": ["Information Overload", "Lack of consistent practice", "Giving up when stuck"],
-        "steps": ["Choose ONE language (e.g. Python)", "Watch a 1-hour crash course", "Build a 'Hello World' app", "Modify specific code to learn"],
-        "timeline": {
-            "day_1": "Install VS Code and Python/Node",
-            "day_2": "Write first 10 lines of code",
-            "week_1": "Build a Calculator or To-Do app"
-        },
-        "action_plan_24h": {
-            "now": "Decide: Python for data or JS for web?",
-            "tonight": "Install the code editor",
-            "tomorrow": "Watch 30 mins of a tutorial"
-        },
-        "psychology_tip": "Coding is 10% writing, 90% debugging. Don't panic when it breaks."
-    },
-    "fitness": {
-        "keywords": ["gym", "workout", "fitness", "weight", "muscle", "fat", "run"],
-        "root_causes": ["Reliance on motivation vs discipline", "Unrealistic early goals", "Poor recovery/sleep"],
-        "steps": ["Define a fixed schedule (Time/Days)", "Prepare gear the night before", "Start with 20 min sessions", "Track every workout"],
-        "timeline": {
-            "day_1": "Do a 20-min test workout at home",
-            "day_2": "Rest or light walk + Stretch",
-            "week_1": "Complete 3 total sessions"
-        },
-        "action_plan_24h": {
-            "now": "Put workout clothes in a visible spot",
-            "tonight": "Sleep 8 hours for recovery",
-            "tomorrow": "Go to gym/park at 7 AM sharp"
-        },
-        "psychology_tip": "The hardest lift is lifting your butt off the couch."
-    },
-    "party": {
-        "keywords": ["party", "birthday", "surprise", "celebration", "event"],
-        "root_causes": ["Last minute panic", "Budget creep", "Guest list confusion"],
-        "steps": ["Set a strict budget and date", "Secure the venue (or house)", "Send invites immediately", "Plan food and music"],
-        "timeline": {
-            "day_1": "Create guest list and pick date",
-            "day_2": "Book venue or order supplies",
-            "week_1": "Confirm RSVPs and menu"
-        },
-        "action_plan_24h": {
-            "now": "Message the key best friend for help",
-            "tonight": "Draft the guest list",
-            "tomorrow": "Send out the 'Save the date'"
-        },
-        "psychology_tip": "People remember the vibe, not the napkin color. Focus on fun."
-    },
-    "cleaning": {
-        "keywords": ["clean", "cleaning", "house", "chore", "mess", "declutter"],
-        "root_causes": ["Overwhelmed by scale", "No system (room by room)", "Distractions"],
-        "steps": ["Start with trash and dishes", "Pick one room at a time", "Set a timer for 20 mins", "Don't organize, just clean"],
-        "timeline": {
-            "day_1": "Trash, Laundry, and Kitchen surfaces",
-            "day_2": "Bathrooms and Floors",
-            "week_1": "Deep clean windows and dusting"
-        },
-        "action_plan_24h": {
-            "now": "Put on music and shoes",
-            "tonight": "Do the dishes before bed",
-            "tomorrow": "Tackle the living room first thing"
-        },
-        "psychology_tip": "Don't put it down, put it away. Momentum is key."
-    },
-    "general": {
-        "keywords": [],
-        "root_causes": ["Lack of Clarity", "Fear of Failure", "No Accountability"],
-        "steps": ["Define the goal clearly", "Break into small pieces", "Schedule the first piece", "Review progress"],
-        "timeline": {
-            "day_1": "Research and Analysis",
-            "day_2": "Initial Setup/Prototype",
-            "week_1": "First Tangible Milestone"
-        },
-        "action_plan_24h": {
-            "now": "Write the goal on paper",
-            "tonight": "Clear schedule for tomorrow",
-            "tomorrow": "Execute the first hour of work"
-        },
-        "psychology_tip": "Action creates motivation, not the other way around."
-    }
-}
-
-def find_template(user_text):
-    text_lower = user_text.lower()
-    for key, data in TOPIC_TEMPLATES.items():
-        if key == "general": continue
-        for kw in data["keywords"]:
-            if kw in text_lower:
-                return data
-    return None
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+KB_EXTENSIONS = (".json", ".yaml", ".yml")
+
+# --- Keyword Index ---
+# One compiled pattern over every keyword, so lookup is a single pass over the
+# text no matter how many topics exist. Keywords are merged into a prefix trie
+# before compiling, which keeps the regex fast with tens of thousands of them.
+# Matches must start and end on word boundaries ("run" no longer hits "brunch");
+# a few plural/verb endings are still allowed ("workouts", "coded").
+SUFFIXES = r"(?:s|es|d|ed|ing)?"
+
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end-of-word marker
+
+    def walk(node):
+        alts = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not alts: return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return walk(trie)
+
+class KeywordIndex:
+    def __init__(self, templates):
+        self.templates = templates
+        self.order = {topic: i for i, topic in enumerate(templates)}
+        self.topics_by_keyword = {}
+        for topic, data in templates.items():
+            if topic == "general": continue
+            for kw in data["keywords"]:
+                kw = kw.lower().strip()
+                if kw: self.topics_by_keyword.setdefault(kw, []).append(topic)
+        self.pattern = re.compile(
+            r"(?<!\w)(?P<kw>" + _trie_pattern(self.topics_by_keyword) + ")" + SUFFIXES + r"(?!\w)"
+        ) if self.topics_by_keyword else None
+
+    def match(self, text):
+        """All matching topics as (topic, score) pairs, best first. Score = keyword hits."""
+        if not self.pattern: return []
+        scores = {}
+        for m in self.pattern.finditer(text.lower()):
+            for topic in self.topics_by_keyword[m.group("kw")]:
+                scores[topic] = scores.get(topic, 0) + 1
+        # Ties go to the topic listed first, as in the original loop
+        return sorted(scores.items(), key=lambda item: (-item[1], self.order[item[0]]))
+
+    def best(self, text):
+        matches = self.match(text)
+        return self.templates[matches[0][0]] if matches else None
+
+# --- Loading ---
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"): return json.load(f)
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError(f"{path}: PyYAML is needed for YAML templates (pip install pyyaml)")
+        return yaml.safe_load(f)
+
+def kb_files(directory: str):
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(KB_EXTENSIONS))
+
+def signature(directory: str):
+    """Changes whenever a template file is added, removed or rewritten."""
+    try:
+        return tuple((p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in kb_files(directory))
+    except OSError:
+        return None
+
+class KnowledgeBase:
+    """
+    One immutable, validated snapshot of the templates:
+      templates  topic -> raw template dict
+      plans      topic -> validated plan (schema instance with problem="")
+      bodies     topic -> the plan pre-serialized as JSON bytes, split around the
+                 `problem` value so plan_json() only has to splice it in
+      index      KeywordIndex over the keywords
+    """
+    PROBLEM_MARKER = "\x00problem\x00"
+    FALLBACK_TOPIC = "general"  # answered without the model when the service is overloaded
+
+    def __init__(self, templates: Dict[str, dict], schema=None, sources: Optional[Dict[str, str]] = None):
+        self.templates = templates
+        self.plans, self.bodies = {}, {}
+        if schema is not None:
+            fields = set(schema.model_fields) - {"problem"}
+            for topic, data in templates.items():
+                where = f"{sources[topic]}: " if sources else ""
+                unknown = set(data) - fields - {"keywords"}
+                if unknown: raise ValueError(f"{where}topic '{topic}': unknown fields {sorted(unknown)}")
+                if not isinstance(data.get("keywords", []), list): raise ValueError(f"{where}topic '{topic}': keywords must be a list")
+                try:
+                    plan = schema(**{k: v for k, v in data.items() if k != "keywords"}, problem="")
+                except Exception as e:
+                    raise ValueError(f"{where}topic '{topic}': {e}")
+                self.plans[topic] = plan
+                encoded = plan.model_copy(update={"problem": self.PROBLEM_MARKER}).model_dump_json().encode("utf-8")
+                before, _, after = encoded.partition(json.dumps(self.PROBLEM_MARKER).encode("utf-8"))
+                self.bodies[topic] = (before, after)
+        self.index = KeywordIndex({t: {"keywords": [], **d} for t, d in templates.items()})
+
+    def plan_json(self, topic: str, problem: str) -> bytes:
+        """The topic's plan as JSON bytes for this problem; same document as plans[topic] with the problem set."""
+        before, after = self.bodies[topic]
+        try:
+            # UTF-8 like pydantic, so the bytes match a serialized FinalPlan exactly
+            value = json.dumps(problem, ensure_ascii=False).encode("utf-8")
+        except UnicodeEncodeError:
+            value = json.dumps(problem).encode("ascii")  # lone surrogates: escape instead
+        return before + value + after
+
+    @classmethod
+    def load(cls, directory: str, schema=None) -> "KnowledgeBase":
+        templates, sources = {}, {}
+        for path in kb_files(directory):
+            data = _read(path) or {}
+            if not isinstance(data, dict): raise ValueError(f"{path}: expected a mapping of topic -> template")
+            for topic, template in data.items():
+                if topic in templates: raise ValueError(f"{path}: topic '{topic}' is defined twice")
+                if not isinstance(template, dict): raise ValueError(f"{path}: topic '{topic}' is not a mapping")
+                templates[topic] = template
+                sources[topic] = path
+        if not templates: raise ValueError(f"No templates found in {directory}")
+        if cls.FALLBACK_TOPIC not in templates: raise ValueError(f"{directory}: a '{cls.FALLBACK_TOPIC}' topic is required")
+        return cls(templates, schema, sources)
+
+class KnowledgeBaseStore:
+    """
+    Holds the live KnowledgeBase and hot-reloads it when the files change.
+    A reload builds and validates a complete new snapshot before swapping the
+    reference, so readers never block and never see a half-loaded state; an
+    invalid edit is logged and the previous snapshot stays live.
+    Readers should take `store.current` once per request.
+    """
+
+    def __init__(self, directory: str, schema=None, interval: float = 2.0):
+        self.directory = directory
+        self.schema = schema
+        self.interval = interval
+        self.reloads = 0
+        self.failures = 0
+        self.signature = signature(directory)
+        self.current = KnowledgeBase.load(directory, schema)
+        self.watcher = None
+        self.lock = threading.Lock()
+
+    def reload(self, force: bool = False) -> bool:
+        """Swaps in a fresh snapshot if the files changed (or force). True if swapped."""
+        with self.lock:
+            sig = signature(self.directory)
+            if not force and sig == self.signature: return False
+            self.signature = sig
+            try:
+                fresh = KnowledgeBase.load(self.directory, self.schema)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Knowledge base reload failed; keeping the current templates: {e}")
+                return False
+            self.current = fresh
+            self.reloads += 1
+            logger.info(f"Knowledge base reloaded: {len(fresh.templates)} topics.")
+            return True
+
+    def watch(self):
+        """Polls the directory on a daemon thread (once per process; call after any fork)."""
+        if self.watcher or self.interval <= 0: return
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                self.reload()
+        self.watcher = threading.Thread(target=loop, name="kb-reloader", daemon=True)
+        self.watcher.start()
+
+    def stats(self) -> dict:
+        return {"topics": len(self.current.templates), "reloads": self.reloads, "failures": self.failures}
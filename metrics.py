@@ -0,0 +1,134 @@
+# metrics.py — Instrumentation & Prometheus Export
+# A small dependency-free registry (counters, gauges, histograms) rendered in
+# the Prometheus text format on GET /metrics, plus per-request stage timings
+# that can be returned as a Server-Timing header.
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names: return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, _labels(self.label_names, k), v) for k, v in sorted(self.values.items())]
+
+class Gauge:
+    """Value read at scrape time from a callback."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None):
+        self.name, self.help, self.fn = name, help, fn
+        REGISTRY.append(self)
+
+    def samples(self):
+        value = self.fn() if self.fn else None
+        return [] if value is None else [(self.name, "", value)]
+
+class Histogram:
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self.lock:
+            s = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, s in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, s):
+                    out.append((self.name + "_bucket", _labels(self.label_names + ("le",), key + (bound,)), count))
+                out.append((self.name + "_bucket", _labels(self.label_names + ("le",), key + ("+Inf",)), s[-1]))
+                out.append((self.name + "_sum", _labels(self.label_names, key), round(s[-2], 6)))
+                out.append((self.name + "_count", _labels(self.label_names, key), s[-1]))
+        return out
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in metric.samples())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Metrics ---
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512)
+
+REQUEST_SECONDS = Histogram("lba_request_seconds", "End-to-end HTTP request latency.", ["path", "status"])
+STAGE_SECONDS = Histogram("lba_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+SECTION_SECONDS = Histogram("lba_section_seconds", "Streaming: time until each plan section was ready.", ["field"])
+INPUT_TOKENS = Histogram("lba_input_tokens", "Prompt length in tokens, per generated prompt.", buckets=TOKEN_BUCKETS)
+OUTPUT_TOKENS = Histogram("lba_output_tokens", "Generated length in tokens, per prompt.", buckets=TOKEN_BUCKETS)
+BATCH_SIZE = Histogram("lba_batch_size", "Prompts per model forward batch.", buckets=(1, 2, 4, 8, 16, 32, 64))
+TEMPLATE_LOOKUPS = Counter("lba_template_lookups_total", "Knowledge-base lookups by result and topic.", ["result", "topic"])
+CLARIFY_QUESTIONS = Counter("lba_clarify_questions_total", "Clarifying questions by source: cache, canned or templated.", ["source"])
+QUEUE_DEPTH = Gauge("lba_queue_depth", "Prompts waiting in the micro-batching queue.")
+GENERATION_ERRORS = Counter("lba_generation_errors_total", "Generations that failed and returned a fallback.", ["source"])
+DRAFT_TOKENS = Counter("lba_draft_tokens_total", "Assisted decoding: draft tokens accepted or rejected by the base model.", ["result"])
+ADMISSION = Counter("lba_admission_total", "Chat requests and background model work by admission result: admitted, degraded_queue, degraded_deadline, degraded_timeout or shed.", ["result"])
+ADMITTED = Gauge("lba_admitted_requests", "Plan requests admitted to the model and not yet finished.")
+IN_FLIGHT = Gauge("lba_in_flight_requests", "Requests in progress on the chat routes (the load-shedding limit).")
+BULK_ITEMS = Counter("lba_bulk_items_total", "Bulk plan items (/chat/batch, bulk.py) by source: template, model or error.", ["source"])
+
+# --- Per-request Stage Timings ---
+_timings = contextvars.ContextVar("lba_timings", default=None)
+
+def start_request() -> dict:
+    """Begins collecting stage timings for the current request context."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+@contextmanager
+def stage(name: str):
+    """Times a block into lba_stage_seconds and the current request's timings (if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+def server_timing(timings: dict) -> str:
+    """Formats timings as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
@@ -5,101 +5,26 @@
 # 2. Hugging Face T5 Model (Inference)
 # 3. Logic for Plan Generation
 
+import json
 import logging
 import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, wait
 from typing import List, Dict, Optional
 from pydantic import BaseModel
+import config
+import metrics
+from backends import load_backend
+from knowledge_base import KnowledgeBaseStore
+from plan_cache import PlanCache, make_key
+from scheduler import MicroBatcher
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# --- 1. Knowledge Base ---
-# Hardcoded expert templates to prevent hallucinations/generic answers.
-TOPIC_TEMPLATES = {
-    "coding": {
-        "keywords": ["code", "coding", "programming", "python", "javascript", "developer", "software"],
-        "root_causes": ["Information Overload", "Lack of consistent practice", "Giving up when stuck"],
-        "steps": ["Choose ONE language (e.g. Python)", "Watch a 1-hour crash course", "Build a 'Hello World' app", "Modify specific code to learn"],
-        "timeline": {
-            "day_1": "Install VS Code and Python/Node",
-            "day_2": "Write first 10 lines of code",
-            "week_1": "Build a Calculator or To-Do app"
-        },
-        "action_plan_24h": {
-            "now": "Decide: Python for data or JS for web?",
-            "tonight": "Install the code editor",
-            "tomorrow": "Watch 30 mins of a tutorial"
-        },
-        "psychology_tip": "Coding is 10% writing, 90% debugging. Don't panic when it breaks."
-    },
-    "fitness": {
-        "keywords": ["gym", "workout", "fitness", "weight", "muscle", "fat", "run"],
-        "root_causes": ["Reliance on motivation vs discipline", "Unrealistic early goals", "Poor recovery/sleep"],
-        "steps": ["Define a fixed schedule (Time/Days)", "Prepare gear the night before", "Start with 20 min sessions", "Track every workout"],
-        "timeline": {
-            "day_1": "Do a 20-min test workout at home",
-            "day_2": "Rest or light walk + Stretch",
-            "week_1": "Complete 3 total sessions"
-        },
-        "action_plan_24h": {
-            "now": "Put workout clothes in a visible spot",
-            "tonight": "Sleep 8 hours for recovery",
-            "tomorrow": "Go to gym/park at 7 AM sharp"
-        },
-        "psychology_tip": "The hardest lift is lifting your butt off the couch."
-    },
-    "party": {
-        "keywords": ["party", "birthday", "surprise", "celebration", "event"],
-        "root_causes": ["Last minute panic", "Budget creep", "Guest list confusion"],
-        "steps": ["Set a strict budget and date", "Secure the venue (or house)", "Send invites immediately", "Plan food and music"],
-        "timeline": {
-            "day_1": "Create guest list and pick date",
-            "day_2": "Book venue or order supplies",
-            "week_1": "Confirm RSVPs and menu"
-        },
-        "action_plan_24h": {
-            "now": "Message the key best friend for help",
-            "tonight": "Draft the guest list",
-            "tomorrow": "Send out the 'Save the date'"
-        },
-        "psychology_tip": "People remember the vibe, not the napkin color. Focus on fun."
-    },
-    "cleaning": {
-        "keywords": ["clean", "cleaning", "house", "chore", "mess", "declutter"],
-        "root_causes": ["Overwhelmed by scale", "No system (room by room)", "Distractions"],
-        "steps": ["Start with trash and dishes", "Pick one room at a time", "Set a timer for 20 mins", "Don't organize, just clean"],
-        "timeline": {
-            "day_1": "Trash, Laundry, and Kitchen surfaces",
-            "day_2": "Bathrooms and Floors",
-            "week_1": "Deep clean windows and dusting"
-        },
-        "action_plan_24h": {
-            "now": "Put on music and shoes",
-            "tonight": "Do the dishes before bed",
-            "tomorrow": "Tackle the living room first thing"
-        },
-        "psychology_tip": "Don't put it down, put it away. Momentum is key."
-    },
-    "general": {
-        "keywords": [],
-        "root_causes": ["Lack of Clarity", "Fear of Failure", "No Accountability"],
-        "steps": ["Define the goal clearly", "Break into small pieces", "Schedule the first piece", "Review progress"],
-        "timeline": {
-            "day_1": "Research and Analysis",
-            "day_2": "Initial Setup/Prototype",
-            "week_1": "First Tangible Milestone"
-        },
-        "action_plan_24h": {
-            "now": "Write the goal on paper",
-            "tonight": "Clear schedule for tomorrow",
-            "tomorrow": "Execute the first hour of work"
-        },
-        "psychology_tip": "Action creates motivation, not the other way around."
-    }
-}
-
-# --- 2. Data Models ---
+# --- 1. Data Models ---
 class FinalPlan(BaseModel):
     root_causes: List[str]
     steps: List[str]
@@ -108,86 +33,367 @@ class FinalPlan(BaseModel):
     action_plan_24h: Dict[str, str]
     problem: str
 
-# --- 3. AI Class ---
+# --- 2. Knowledge Base ---
+# Expert templates to prevent hallucinations/generic answers, loaded from
+# config.KB_DIR, validated against FinalPlan and hot-reloaded on change
+# (see knowledge_base.py). Take KNOWLEDGE.current once per lookup.
+KNOWLEDGE = KnowledgeBaseStore(config.KB_DIR, FinalPlan, config.KB_RELOAD_S)
+
+# --- 3. Plan Prompts ---
+# One entry per generated field: (field, slot, prompt template, max_new_tokens).
+# slot is None for list fields, otherwise the key inside the dict field.
+PLAN_PROMPTS = [
+    ("root_causes", None, "List 3 distinct difficulties in '{problem}'. Difficulty 1:", 80),
+    ("steps", None, "List 4 physical actions to finish '{problem}'. Step 1:", 100),
+    ("timeline", "day_1", "Task for Day 1 of '{problem}'?", 40),
+    ("timeline", "day_2", "Task for Day 2 of '{problem}'?", 40),
+    ("timeline", "week_1", "Goal for Week 1 of '{problem}'?", 40),
+    ("action_plan_24h", "now", "Tiny action for '{problem}' RIGHT NOW?", 40),
+    ("action_plan_24h", "tonight", "Prep task for '{problem}' TONIGHT?", 40),
+    ("action_plan_24h", "tomorrow", "Priority for '{problem}' TOMORROW?", 40),
+]
+
+# --- Structured (single-pass) Mode ---
+# The whole plan from one prompt, so the encoder reads the problem once.
+STRUCTURED_PROMPT = (
+    "Break down the problem '{problem}' into a plan. Answer in exactly this format: "
+    "Causes: cause, cause, cause. Steps: step, step, step, step. "
+    "Day 1: task. Day 2: task. Week 1: goal. Now: tiny action. Tonight: prep task. Tomorrow: priority."
+)
+STRUCTURED_MAX_TOKENS = 256
+# Section label for each PLAN_PROMPTS entry, in the same order
+STRUCTURED_LABELS = ["causes", "steps", "day 1", "day 2", "week 1", "now", "tonight", "tomorrow"]
+# A label starts the text, a line or a sentence and ends in ":" ("start now - then review" is prose, not a label)
+_LABEL_RE = re.compile(r"(?:^|(?<=[\n.;!?]))\s*(" + "|".join(l.replace(" ", r"\s*") for l in STRUCTURED_LABELS) + r")\s*:", re.I)
+
+def parse_structured(text: str) -> Dict[int, str]:
+    """
+    Tolerant parser for STRUCTURED_PROMPT output. Returns {PLAN_PROMPTS index: raw text}
+    for every section it could find; missing or empty sections are simply absent.
+    Accepts a JSON object keyed by label as well as the "Label: value" format.
+    """
+    found = {}
+    try:
+        obj = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        for key, value in obj.items():
+            label = " ".join(re.sub(r"[_\d]+", lambda m: " " + m.group().strip("_") + " ", key.lower()).split())
+            # Only text counts: null, numbers and objects are treated as missing
+            if isinstance(value, list): value = ", ".join(v.strip() for v in value if isinstance(v, str) and v.strip())
+            if label in STRUCTURED_LABELS and isinstance(value, str) and value.strip():
+                found[STRUCTURED_LABELS.index(label)] = value.strip()
+    except (ValueError, AttributeError):
+        pass
+    if found: return found
+
+    matches = list(_LABEL_RE.finditer(text))
+    for m, nxt in zip(matches, matches[1:] + [None]):
+        label = " ".join(m.group(1).lower().replace("day", "day ").replace("week", "week ").split())
+        value = text[m.end():nxt.start() if nxt else len(text)].strip(" .;\n")
+        i = STRUCTURED_LABELS.index(label)
+        if value and i not in found:
+            # List sections may come back ";"- or newline-separated; clean_list splits on commas
+            found[i] = re.sub(r"\s*[;\n]\s*", ", ", value) if PLAN_PROMPTS[i][1] is None else value
+    return found
+
+# Used when a generated list has fewer than two usable items
+LIST_FALLBACKS = {
+    "root_causes": ["Unclear Scope", "Inertia", "Lack of definition"],
+    "steps": ["Plan", "Prepare", "Execute", "Review"],
+}
+PSYCHOLOGY_TIP = "Start before you feel ready."
+
+def clean_list(raw, fallback):
+    """Splits a comma-separated generation into list items."""
+    items = [i.strip() for i in raw.split(',') if len(i.strip()) > 3]
+    return items[:4] if len(items) >= 2 else fallback
+
+# --- 4. Decoding ---
+# Sampling gives livelier text; greedy decoding gives reproducible (cacheable) plans.
+SAMPLED_DECODING = {"do_sample": True, "temperature": 0.5, "repetition_penalty": 1.5, "no_repeat_ngram_size": 2}
+GREEDY_DECODING = {"do_sample": False, "num_beams": 1, "repetition_penalty": 1.5, "no_repeat_ngram_size": 2}
+
+# --- 5. AI Class ---
 class LifeGuideAI:
-    def __init__(self):
-        self.generator = None
+    MODEL_ID = config.MODEL_ID
+
+    def __init__(self, deterministic: bool = config.DETERMINISTIC, autoload: bool = True,
+                 generation_mode: str = config.GENERATION_MODE, model_id: Optional[str] = None):
+        """
+        autoload=False defers the (slow) model load to an explicit start(),
+        so servers can answer template hits while the model loads.
+        model_id overrides LBA_MODEL (e.g. to run a teacher and a student side by side).
+        """
+        self.model_id = model_id or self.MODEL_ID
+        self.backend = None
+        self.batcher = None
         self.available = False
+        # cold -> loading -> warming -> ready, or unavailable (mock responses)
+        self.status = "cold"
+        self.decoding = GREEDY_DECODING if deterministic else SAMPLED_DECODING
+        self.generation_mode = generation_mode
+        # Only reproducible plans are cached
+        self.plan_cache = PlanCache(
+            config.PLAN_CACHE_SIZE, config.PLAN_CACHE_TTL_S, config.PLAN_CACHE_MAX_BYTES,
+            config.PLAN_CACHE_PATH or None
+        ) if deterministic else None
+        self.semantic_index = None
+        if config.SEMANTIC_INDEX_DIR:
+            try:
+                from retrieval import SemanticIndex
+                self.semantic_index = SemanticIndex(config.SEMANTIC_INDEX_DIR, config.SEMANTIC_THRESHOLD, config.SEMANTIC_TOP_K)
+            except Exception as e:
+                logger.error(f"Failed to load semantic index: {e}")
+        if autoload: self.load_model()
+
+    @property
+    def ready(self):
+        """True once model-backed calls can be served (real or mock)."""
+        return self.status in ("ready", "unavailable")
+
+    def start(self, background: bool = True):
+        """Starts knowledge-base hot reload, then loads and warms the model (by default on a background thread)."""
+        KNOWLEDGE.watch()
+        if background:
+            threading.Thread(target=self.start, args=(False,), name="model-loader", daemon=True).start()
+            return
         self.load_model()
 
+    def load_weights(self):
+        """
+        Loads the backend only: no threads are started, so this is safe to call
+        in a parent process before forking workers that share the weights.
+        """
+        # Utilizing local cache if available
+        self.backend = load_backend(config.BACKEND, self.model_id, config.TORCH_THREADS)
+
     def load_model(self):
+        self.status = "loading"
         try:
-            from transformers import pipeline
-            MODEL_ID = "google/flan-t5-base"
-            logger.info(f"Loading {MODEL_ID}...")
-            # Utilizing local cache if available
-            self.generator = pipeline("text2text-generation", model=MODEL_ID, max_length=512, truncation=True)
+            # Weights may already be in memory, inherited from a pre-fork parent (serve.py)
+            if self.backend is None: self.load_weights()
+            # All requests share one queue so concurrent prompts run as a single batch
+            # early_rows: short sections resolve as soon as their own rows finish (streaming)
+            self.batcher = MicroBatcher(self.generate_batch, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS, early_rows=True)
             self.available = True
             logger.info("AI Model Loaded Successfully.")
+            self.warmup()
         except Exception as e:
             logger.error(f"Failed to load AI: {e}")
             self.available = False
+            self.status = "unavailable"
+
+    def warmup(self, size: int = config.WARMUP_BATCH_SIZE):
+        """Runs one throwaway batch so the first real request doesn't pay for lazy init."""
+        self.status = "warming"
+        if size > 0:
+            prompts = [(prompt.format(problem="organize my week"), max_tokens) for _, _, prompt, max_tokens in PLAN_PROMPTS]
+            try:
+                self.generate_batch((prompts * size)[:size])
+                logger.info(f"Warmup batch of {size} done.")
+            except Exception as e:
+                logger.error(f"Warmup failed: {e}")
+        self.status = "ready"
 
     def find_template(self, text):
         """RAG-lite Retrieval"""
-        text_lower = text.lower()
-        for key, data in TOPIC_TEMPLATES.items():
-            if key == "general": continue
-            for kw in data["keywords"]:
-                if kw in text_lower:
-                    return data
-        return None
+        topic = self.find_topic(text)
+        return KNOWLEDGE.current.templates[topic] if topic else None
+
+    def find_topic(self, text, kb=None) -> Optional[str]:
+        """Best keyword-matching topic in the given (default: live) knowledge base."""
+        kb = kb or KNOWLEDGE.current
+        with metrics.stage("retrieval"):
+            matches = kb.index.match(text)
+        topic = matches[0][0] if matches else ""
+        metrics.TEMPLATE_LOOKUPS.inc(result="hit" if matches else "miss", topic=topic)
+        return topic or None
 
-    def safe_generate(self, prompt, max_tokens=64):
+    def safe_generate(self, prompt, max_tokens=64, cancel=None):
         if not self.available: return "Mock AI Response"
         try:
-            # Discrete prompting strategy
-            return self.generator(
-                prompt, max_new_tokens=max_tokens, 
-                do_sample=True, temperature=0.5, 
-                repetition_penalty=1.5, no_repeat_ngram_size=2
-            )[0]['generated_text'].strip()
-        except: return "Analysis Error"
-
-    def infer_plan(self, problem: str) -> FinalPlan:
-        # 1. Try Retrieval
-        template = self.find_template(problem)
-        if template:
+            # Discrete prompting strategy, batched with other in-flight prompts
+            return self.batcher.submit([(prompt, max_tokens)], cancel)[0]
+        except CancelledError: return "Analysis Error"
+        except Exception as e:
+            logger.warning(f"Generation failed: {e}")
+            metrics.GENERATION_ERRORS.inc(source="safe_generate")
+            return "Analysis Error"
+
+    def safe_generate_batch(self, requests, cancel=None):
+        """Generates several (prompt, max_tokens) pairs through the shared micro-batcher."""
+        if not self.available: return ["Mock AI Response"] * len(requests)
+        try:
+            return self.batcher.submit(requests, cancel)
+        except CancelledError: return ["Analysis Error"] * len(requests)
+        except Exception as e:
+            logger.warning(f"Batch generation failed: {e}")
+            metrics.GENERATION_ERRORS.inc(len(requests), source="safe_generate_batch")
+            return ["Analysis Error"] * len(requests)
+
+    def generate_batch(self, requests, on_row=None):
+        """Runs one padded batch of (prompt, max_tokens) pairs on the configured backend; on_row(i, text) hears of each row as it finishes."""
+        return self.backend.generate(requests, self.decoding, on_row)
+
+    def semantic_topic(self, text, kb) -> Optional[str]:
+        """Embedding retrieval for problems that miss every keyword."""
+        if not self.semantic_index: return None
+        with metrics.stage("semantic"):
+            matches = self.semantic_index.search(text)
+        # The index is built offline, so it may name topics a reload has since removed
+        matches = [m for m in matches if m[0] in kb.plans]
+        if not matches: return None
+        logger.info(f"Semantic matches: {matches}")
+        return matches[0][0]
+
+    def template_plan(self, problem: str) -> Optional[FinalPlan]:
+        """Knowledge-base plan for the problem, or None. Cheap enough to run on the event loop."""
+        kb = KNOWLEDGE.current
+        topic = self.find_topic(problem, kb)
+        if topic:
             logger.info(f"Using Knowledge Base for: {problem}")
-            return FinalPlan(**template, problem=problem)
+            # Validated once at load; only the problem differs per request
+            return kb.plans[topic].model_copy(update={"problem": problem})
+        return None
+
+    def template_json(self, problem: str) -> Optional[bytes]:
+        """
+        template_plan as pre-encoded JSON bytes: the fast path for serving a hit
+        without building, validating or serializing a FinalPlan.
+        """
+        kb = KNOWLEDGE.current
+        topic = self.find_topic(problem, kb)
+        if not topic: return None
+        logger.info(f"Using Knowledge Base for: {problem}")
+        return kb.plan_json(topic, problem)
+
+    def cache_key(self, problem: str) -> Optional[str]:
+        if not self.plan_cache: return None
+        return make_key(problem, {"model": self.model_id, "backend": config.BACKEND, "mode": self.generation_mode, **self.decoding})
+
+    def lookup_plan(self, problem: str) -> Optional[FinalPlan]:
+        """Every way to answer without generating: keywords, embeddings, then the plan cache."""
+        # 1. Try Retrieval
+        plan = self.template_plan(problem)
+        if plan: return plan
+        return self.retrieve_plan(problem)
+
+    def retrieve_plan(self, problem: str) -> Optional[FinalPlan]:
+        """lookup_plan after a keyword miss: embeddings, then the plan cache."""
+        # 2. Semantic Retrieval (kept off the event loop: embedding can be a model call)
+        kb = KNOWLEDGE.current
+        topic = self.semantic_topic(problem, kb)
+        if topic:
+            logger.info(f"Using Semantic Knowledge Base for: {problem}")
+            return kb.plans[topic].model_copy(update={"problem": problem})
+
+        # 3. Plan Cache (deterministic mode only)
+        key = self.cache_key(problem)
+        cached = None
+        if key:
+            with metrics.stage("cache"):
+                cached = self.plan_cache.get(key)
+        if cached:
+            logger.info(f"Using Plan Cache for: {problem}")
+            return FinalPlan(**cached, problem=problem)
+        return None
 
-        # 2. General Inference
+    def remember(self, problem: str, outputs: List[str], plan: FinalPlan):
+        # Never persist mock output or failed generations
+        key = self.cache_key(problem)
+        if key and self.available and "Analysis Error" not in outputs:
+            self.plan_cache.set(key, plan.model_dump(exclude={"problem"}))
+
+    def plan_prompts(self, problem: str):
+        return [(prompt.format(problem=problem), max_tokens) for _, _, prompt, max_tokens in PLAN_PROMPTS]
+
+    def structured_outputs(self, problem: str, cancel=None) -> List[str]:
+        """Single-pass mode: one generation for the whole plan, per-field prompts only for what didn't parse."""
+        raw = self.safe_generate(STRUCTURED_PROMPT.format(problem=problem), STRUCTURED_MAX_TOKENS, cancel)
+        parsed = parse_structured(raw)
+        missing = [i for i in range(len(PLAN_PROMPTS)) if i not in parsed]
+        if missing:
+            logger.info(f"Structured output missing {len(missing)} section(s); generating them separately.")
+            prompts = self.plan_prompts(problem)
+            parsed.update(zip(missing, self.safe_generate_batch([prompts[i] for i in missing], cancel)))
+        return [parsed[i] for i in range(len(PLAN_PROMPTS))]
+
+    def generate_outputs(self, problem: str, cancel=None) -> List[str]:
+        """Raw text for every PLAN_PROMPTS entry, in the configured generation mode."""
+        if self.generation_mode == "structured":
+            return self.structured_outputs(problem, cancel)
+        return self.safe_generate_batch(self.plan_prompts(problem), cancel)
+
+    def infer_plan(self, problem: str, cancel=None) -> FinalPlan:
+        return self.lookup_plan(problem) or self.generate_plan(problem, cancel)
+
+    def generate_plan(self, problem: str, cancel=None) -> FinalPlan:
+        """infer_plan without the lookups, for callers that already ran them."""
+        # 4. General Inference
         logger.info(f"Using AI Inference for: {problem}")
-        
-        # Helper to clean lists
-        def clean(raw, fallback):
-            items = [i.strip() for i in raw.split(',') if len(i.strip()) > 3]
-            return items[:4] if len(items) >= 2 else fallback
-
-        # Generate Fields
-        raw_causes = self.safe_generate(f"List 3 distinct difficulties in '{problem}'. Difficulty 1:", 80)
-        causes = clean(raw_causes, ["Unclear Scope", "Inertia", "Lack of definition"])
-
-        raw_steps = self.safe_generate(f"List 4 physical actions to finish '{problem}'. Step 1:", 100)
-        steps = clean(raw_steps, ["Plan", "Prepare", "Execute", "Review"])
-
-        timeline = {
-            "day_1": self.safe_generate(f"Task for Day 1 of '{problem}'?", 40),
-            "day_2": self.safe_generate(f"Task for Day 2 of '{problem}'?", 40),
-            "week_1": self.safe_generate(f"Goal for Week 1 of '{problem}'?", 40)
-        }
-
-        action_plan = {
-            "now": self.safe_generate(f"Tiny action for '{problem}' RIGHT NOW?", 40),
-            "tonight": self.safe_generate(f"Prep task for '{problem}' TONIGHT?", 40),
-            "tomorrow": self.safe_generate(f"Priority for '{problem}' TOMORROW?", 40)
-        }
-
-        return FinalPlan(
-            root_causes=causes,
-            steps=steps,
-            timeline=timeline,
-            psychology_tip="Start before you feel ready.",
-            action_plan_24h=action_plan,
-            problem=problem
-        )
+        with metrics.stage("generate"):
+            outputs = self.generate_outputs(problem, cancel)
+        plan = self.build_plan(problem, outputs)
+        self.remember(problem, outputs, plan)
+        return plan
+
+    def stream_plan(self, problem: str, cancel=None, lookup: bool = True):
+        """
+        Like infer_plan, but yields each section as soon as its generation finishes:
+        {"field", "slot", "value"} dicts, then the complete FinalPlan last.
+        Lookup hits yield only the FinalPlan; lookup=False skips the lookups.
+        """
+        plan = self.lookup_plan(problem) if lookup else None
+        if plan:
+            yield plan
+            return
+
+        logger.info(f"Streaming AI Inference for: {problem}")
+        yield {"field": "psychology_tip", "slot": None, "value": PSYCHOLOGY_TIP}
+        prompts = self.plan_prompts(problem)
+        outputs = ["Mock AI Response"] * len(prompts)
+        if self.generation_mode == "structured":
+            # One generation produces every section, so they all arrive together
+            outputs = self.structured_outputs(problem, cancel)
+            for i, text in enumerate(outputs): yield self.section(i, text)
+        elif self.available:
+            start = time.perf_counter()
+            futures = self.batcher.submit_async(prompts)
+            index = {f: i for i, f in enumerate(futures)}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    for f in pending: f.cancel()
+                    return
+                for f in sorted(done, key=index.get):
+                    i = index[f]
+                    error = f.exception()
+                    if error:
+                        logger.warning(f"Section generation failed: {error}")
+                        metrics.GENERATION_ERRORS.inc(source="stream_plan")
+                    outputs[i] = "Analysis Error" if error else f.result()
+                    field, slot, _, _ = PLAN_PROMPTS[i]
+                    metrics.SECTION_SECONDS.observe(time.perf_counter() - start, field=f"{field}.{slot}" if slot else field)
+                    yield self.section(i, outputs[i])
+        else:
+            for i, text in enumerate(outputs): yield self.section(i, text)
+
+        plan = self.build_plan(problem, outputs)
+        self.remember(problem, outputs, plan)
+        yield plan
+
+    def section(self, i: int, text: str) -> dict:
+        """One PLAN_PROMPTS output as a cleaned plan section."""
+        field, slot, _, _ = PLAN_PROMPTS[i]
+        value = text if slot else clean_list(text, LIST_FALLBACKS[field])
+        return {"field": field, "slot": slot, "value": value}
+
+    def build_plan(self, problem: str, outputs: List[str]) -> FinalPlan:
+        """Maps generations (in PLAN_PROMPTS order) back into a FinalPlan."""
+        fields = {"timeline": {}, "action_plan_24h": {}}
+        for i, text in enumerate(outputs):
+            section = self.section(i, text)
+            if section["slot"]: fields[section["field"]][section["slot"]] = section["value"]
+            else: fields[section["field"]] = section["value"]
+
+        return FinalPlan(**fields, psychology_tip=PSYCHOLOGY_TIP, problem=problem)
@@ -0,0 +1,120 @@
+# plan_cache.py — Plan-level Response Cache
+# Maps (normalized problem text, decoding config) -> generated plan.
+# In-memory LRU with TTL and a byte cap, optionally backed by SQLite so
+# entries survive restarts. Only worth enabling with deterministic decoding:
+# sampled plans are not reproducible, so a cached one is not "the" answer.
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlite_conn import SQLiteConnection
+
+logger = logging.getLogger(__name__)
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form of the problem text."""
+    return " ".join(text.lower().split())
+
+def make_key(problem: str, decoding: dict) -> str:
+    raw = normalize(problem) + "\x00" + json.dumps(decoding, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class SQLiteBackend(SQLiteConnection):
+    """Durable second tier. Values are the same JSON strings the memory tier holds."""
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.reopen()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS plans (key TEXT PRIMARY KEY, value TEXT, created REAL)")
+        self.conn.execute("DELETE FROM plans WHERE created < ?", (time.time() - ttl,))
+        self.conn.commit()
+
+    def get(self, key: str):
+        """Returns (value, created) or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM plans WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[1] > self.ttl:
+            self.delete(key)
+            return None
+        return row
+
+    def set(self, key: str, value: str, created: float):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?)", (key, value, created))
+            self.conn.commit()
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+            self.conn.commit()
+
+class PlanCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, max_bytes: int = 16 * 1024 * 1024,
+                 path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value json, created); most recently used last
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk = SQLiteBackend(path, ttl) if path else None
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.time() - entry[1] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[0])
+        row = self.disk.get(key) if self.disk else None
+        with self.lock:
+            if not row:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._put(key, row[0], row[1])
+        return json.loads(row[0])
+
+    def set(self, key: str, plan: dict):
+        value, created = json.dumps(plan), time.time()
+        with self.lock:
+            self._put(key, value, created)
+        if self.disk: self.disk.set(key, value, created)
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "persistent": self.disk is not None,
+            }
+
+    # --- internals (caller holds self.lock) ---
+    def _put(self, key, value, created):
+        if key in self.entries: self._drop(key)
+        self.entries[key] = (value, created)
+        self.bytes += len(value)
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        value, _ = self.entries.pop(key)
+        self.bytes -= len(value)
@@ -0,0 +1,148 @@
+# retrieval.py — Semantic Retrieval over the Knowledge Base
+# Catches problems that mean a template's topic without using its keywords
+# (with a sentence encoder, "I can't get myself to exercise" -> fitness).
+# Paraphrases need a sentence encoder: the default hashing embedder only
+# scores shared (non-stopword) words, so it catches rewordings of a
+# template's own vocabulary and nothing more. Template embeddings are built
+# offline into a float32 .npy matrix that is memory-mapped at serve time, so
+# scoring is one matrix-vector product and workers share the same pages.
+#
+# Build:  python retrieval.py build --out kb_index
+#         python retrieval.py build --out kb_index --embedder sentence-transformers/all-MiniLM-L6-v2
+# Query:  python retrieval.py search --index kb_index "my workout schedule keeps slipping"
+
+import argparse
+import json
+import logging
+import os
+import re
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+META_FILE = "meta.json"
+
+# --- Embedders ---
+# Common English function words; they say nothing about a topic
+STOPWORDS = set("""
+a about above after again all am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers herself
+him himself his how i if in into is it its itself just me more most my myself no nor not now of off on once only
+or other our ours ourselves out over own same she should so some such than that the their theirs them themselves
+then there these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours yourself yourselves
+""".split())
+
+class HashingEmbedder:
+    """
+    Model-free embedder: signed feature hashing of word unigrams and bigrams.
+    CPU-only and deterministic, so the whole retrieval path can be tested offline.
+    It only sees shared words, so its similarities are low: hence the threshold near 0.1.
+    """
+    name = "hashing"
+    threshold = 0.1  # recommended minimum similarity, written to meta.json
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = [w for w in re.findall(r"[\w']+", text.lower()) if w not in STOPWORDS]
+            for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(feature.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(out)
+
+class TransformerEmbedder:
+    """Mean-pooled sentence embeddings from any Hugging Face encoder (e.g. all-MiniLM-L6-v2)."""
+    threshold = 0.5
+
+    def __init__(self, model_id: str):
+        from transformers import AutoModel, AutoTokenizer
+        import torch
+        self.name = model_id
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModel.from_pretrained(model_id).eval()
+        self.dim = self.model.config.hidden_size
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=256, return_tensors="pt")
+        with self.torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        return _normalize(pooled.numpy().astype(np.float32))
+
+def make_embedder(name: str, dim: int = 1024):
+    return HashingEmbedder(dim) if name == "hashing" else TransformerEmbedder(name)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+# --- Offline Build ---
+def template_text(topic: str, data: dict) -> str:
+    """Everything that describes a template's topic, flattened into one passage."""
+    parts = [topic] + data.get("keywords", []) + data["root_causes"] + data["steps"] + [data["psychology_tip"]]
+    return ". ".join(parts)
+
+def build_index(templates: dict, embedder, out_dir: str):
+    topics = [t for t in templates if t != "general"]
+    matrix = embedder.encode([template_text(t, templates[t]) for t in topics])
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, EMBEDDINGS_FILE), matrix)
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump({"embedder": embedder.name, "dim": int(matrix.shape[1]), "threshold": embedder.threshold, "topics": topics}, f, indent=2)
+    logger.info(f"Wrote {len(topics)} template embeddings ({embedder.name}) to {out_dir}")
+
+# --- Serving ---
+class SemanticIndex:
+    def __init__(self, index_dir: str, threshold: Optional[float] = None, top_k: int = 3, embedder=None):
+        with open(os.path.join(index_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.topics = meta["topics"]
+        # Page-cache backed; nothing is copied into the process heap
+        self.matrix = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        # Queries must be embedded the same way the index was built
+        self.embedder = embedder or make_embedder(meta["embedder"], meta["dim"])
+        # Default: the threshold the index was built for (0.5 for indexes that predate it)
+        self.threshold = meta.get("threshold", 0.5) if threshold is None else threshold
+        self.top_k = top_k
+
+    def search(self, text: str) -> List[Tuple[str, float]]:
+        """Top-k (topic, cosine similarity) pairs above the threshold, best first."""
+        scores = self.matrix @ self.embedder.encode([text])[0]
+        k = min(self.top_k, len(scores))
+        if k == 0: return []  # no topics besides `general`
+        best = np.argpartition(-scores, k - 1)[:k]
+        ranked = sorted(best, key=lambda i: -scores[i])
+        return [(self.topics[i], float(scores[i])) for i in ranked if scores[i] >= self.threshold]
+
+def main():
+    import model
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build or query the semantic template index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--out", default="kb_index")
+    build.add_argument("--embedder", default="hashing", help="'hashing' or a Hugging Face model id")
+    build.add_argument("--dim", type=int, default=1024, help="hashing embedder only")
+    search = sub.add_parser("search")
+    search.add_argument("--index", default="kb_index")
+    search.add_argument("--threshold", type=float, default=0.0)
+    search.add_argument("text")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(model.KNOWLEDGE.current.templates, make_embedder(args.embedder, args.dim), args.out)
+    else:
+        print(SemanticIndex(args.index, args.threshold, top_k=5).search(args.text))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# scheduler.py — Cross-request Dynamic Micro-batching
+# Collects (prompt, max_tokens) items from every in-flight request into one
+# queue, and a single worker thread runs them through the model in batches.
+# One worker also means torch threads are never contended by parallel calls.
+# A batch function that reports rows as they finish (early_rows) resolves each
+# caller's future then, not when the batch's longest row is done.
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, wait
+from typing import Callable, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[List[Tuple[str, int]]], List[str]]
+
+class MicroBatcher:
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = 16, max_wait_ms: float = 10, early_rows: bool = False):
+        """early_rows: batch_fn also takes on_row(i, text), called as each row finishes."""
+        self.batch_fn = batch_fn
+        self.early_rows = early_rows
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.cancelled = 0
+        self.size_counts = {}  # batch size -> number of batches run at that size
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, requests: List[Tuple[str, int]], cancel: Optional[threading.Event] = None) -> List[str]:
+        """
+        Queues the caller's prompts and blocks until every one has been generated.
+        Setting `cancel` withdraws prompts that have not reached the model yet.
+        """
+        # Abandoned while waiting for an inference thread (e.g. deadline passed): never queue
+        if cancel is not None and cancel.is_set(): raise CancelledError()
+        futures = self.submit_async(requests)
+        while cancel is not None:
+            _, pending = wait(futures, timeout=0.05)
+            if not pending: break
+            if cancel.is_set():
+                for f in pending: f.cancel()
+                raise CancelledError()
+        return [f.result() for f in futures]
+
+    def submit_async(self, requests: List[Tuple[str, int]]) -> List[Future]:
+        """Queues the prompts and returns one Future per prompt, in order."""
+        futures = []
+        for request in requests:
+            future = Future()
+            self.queue.put((request, future))
+            futures.append(future)
+        return futures
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "cancelled": self.cancelled,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size_seen": self.largest_batch,
+                "batch_size_histogram": dict(sorted(self.size_counts.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until the batch is full or the wait expires."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            collected = self._collect()
+            # Drop prompts whose caller went away while they were queued
+            batch = [(request, f) for request, f in collected if f.set_running_or_notify_cancel()]
+            with self.lock:
+                self.cancelled += len(collected) - len(batch)
+            if not batch: continue
+            requests = [request for request, _ in batch]
+            metrics.BATCH_SIZE.observe(len(batch))
+
+            def finish(i, text, batch=batch):
+                if not batch[i][1].done(): batch[i][1].set_result(text)
+
+            try:
+                with metrics.stage("batch"):
+                    outputs = self.batch_fn(requests, on_row=finish) if self.early_rows else self.batch_fn(requests)
+                for i, text in enumerate(outputs): finish(i, text)
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done(): future.set_exception(e)
+            with self.lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.size_counts[len(batch)] = self.size_counts.get(len(batch), 0) + 1
@@ -0,0 +1,117 @@
+# serve.py — Multi-process Serving
+# Pre-fork launcher for app.py. The parent loads the model weights once, binds
+# the listening socket, then forks N workers. Weight memory is inherited
+# copy-on-write and never written after load, so it stays shared: adding a
+# worker costs its own interpreter, batcher and activations, not another model.
+# Each worker gets an equal share of the cores for torch's intra-op threads.
+#
+# Usage:
+#   python serve.py --workers 4 --port 8000
+#   LBA_WORKERS=4 python serve.py
+# Measure memory per worker with: python -m benchmarks.worker_memory
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+import config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("serve")
+
+def threads_per_worker(workers: int) -> int:
+    """LBA_TORCH_THREADS if set, else the cores split evenly (at least one each)."""
+    if config.TORCH_THREADS > 0: return config.TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app_module, sock: socket.socket, threads: int):
+    """Child process: re-size torch threads, then serve on the shared socket until signalled."""
+    brain = app_module.brain
+    if brain.backend: brain.backend.set_threads(threads)
+    if brain.plan_cache and brain.plan_cache.disk: brain.plan_cache.disk.reopen()
+    if hasattr(app_module.session_store, "reopen"): app_module.session_store.reopen()
+    # The app's lifespan hook starts the batcher and warmup; load_model() skips the inherited weights
+    server = uvicorn.Server(uvicorn.Config(app_module.app, log_level="info"))
+    server.run(sockets=[sock])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    import app
+    # Load once in the parent; on failure each worker retries (and may fall back to mock responses)
+    try:
+        app.brain.load_weights()
+    except Exception as e:
+        logger.error(f"Failed to preload model in parent: {e}")
+    sock = bind(args.host, args.port)
+    threads = threads_per_worker(args.workers)
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # the children do not touch (and un-share) the parent's object pages
+    gc.freeze()
+
+    workers = {}
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(app, sock, threads)
+            finally:
+                os._exit(0)
+        workers[pid] = time.monotonic()
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers): spawn()
+    logger.info(f"Serving on http://{args.host}:{args.port} with {args.workers} workers x {threads} torch threads.")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if stopping or started is None: continue
+        logger.warning(f"Worker {pid} exited (status {status}); restarting.")
+        # Avoid a tight respawn loop when workers crash on startup
+        if time.monotonic() - started < 1: time.sleep(1)
+        spawn()
+    sock.close()
+
+if __name__ == "__main__":
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork() (Linux/macOS); use `python app.py` on this platform.")
+    main()
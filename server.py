@@ -1,30 +1,72 @@
 # server.py — Robust Life Breakdown AI V4
 # Includes advanced error handling and knowledge base integration
 
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+from contextlib import asynccontextmanager
 import uvicorn
 import logging
 import re
-import knowledge_base
+import threading
+import time
+import model  # structured-mode prompt and parser, knowledge base
+import clarifier
+import config
+import metrics
+from backends import load_backend
+from scheduler import MicroBatcher
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- Model Loading ---
+# Loaded on a background thread at startup (see lifespan), not at import.
+# MODEL_STATUS: cold -> loading -> warming -> ready, or unavailable
 AI_AVAILABLE = False
-generator = None
-try:
-    from transformers import pipeline
-    MODEL_ID = "google/flan-t5-base" 
-    generator = pipeline("text2text-generation", model=MODEL_ID, max_length=512, truncation=True)
-    AI_AVAILABLE = True
-except Exception as e:
-    logger.error(f"Failed to load AI: {e}")
+MODEL_STATUS = "cold"
+backend = None
+batcher = None
 
-app = FastAPI()
+def load_model():
+    global AI_AVAILABLE, MODEL_STATUS, backend, batcher
+    MODEL_STATUS = "loading"
+    try:
+        backend = load_backend(config.BACKEND, config.MODEL_ID, config.TORCH_THREADS)
+        # Prompts from every in-flight request share one queue and run as one batch
+        batcher = MicroBatcher(generate_batch, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS)
+        AI_AVAILABLE = True
+        MODEL_STATUS = "warming"
+        if config.WARMUP_BATCH_SIZE > 0:
+            generate_batch([("What is the first step to organize my week?", 40)] * config.WARMUP_BATCH_SIZE)
+        MODEL_STATUS = "ready"
+    except Exception as e:
+        logger.error(f"Failed to load AI: {e}")
+        MODEL_STATUS = "ready" if AI_AVAILABLE else "unavailable"
+
+def model_ready():
+    return MODEL_STATUS in ("ready", "unavailable")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model.KNOWLEDGE.watch()
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+metrics.QUEUE_DEPTH.fn = lambda: batcher.queue.qsize() if batcher else None
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    path = request.url.path if request.url.path in ("/", "/chat", "/healthz", "/readyz", "/stats", "/metrics") else "other"
+    metrics.REQUEST_SECONDS.observe(elapsed, path=path, status=response.status_code)
+    if config.TIMING_HEADER: response.headers["Server-Timing"] = metrics.server_timing({**timings, "total": elapsed})
+    return response
 
 class ChatMessage(BaseModel):
     role: str
@@ -45,16 +87,58 @@ class ChatResponse(BaseModel):
 
 # --- Logic ---
 
+# Lower temp for logic, N-gram penalty for repetition
+DECODING = {"do_sample": True, "temperature": 0.5, "repetition_penalty": 1.5, "no_repeat_ngram_size": 2}
+
+def generate_batch(requests):
+    """Generates (prompt, max_tokens) pairs as one padded batch, clipping each row to its own budget."""
+    return backend.generate(requests, DECODING)
+
 def safe_generate(prompt, max_tokens=64):
     if not AI_AVAILABLE: return ""
     try:
-        # Lower temp for logic, N-gram penalty for repetition
-        return generator(prompt, max_new_tokens=max_tokens, do_sample=True, temperature=0.5, repetition_penalty=1.5, no_repeat_ngram_size=2)[0]['generated_text'].strip()
-    except: return ""
+        return batcher.submit([(prompt, max_tokens)])[0]
+    except Exception as e:
+        logger.warning(f"Generation failed: {e}")
+        metrics.GENERATION_ERRORS.inc(source="safe_generate")
+        return ""
+
+# Clarifying questions; model-written ones are generated in the background once the model is up
+clarifications = clarifier.Clarifier(
+    config.CLARIFY_CACHE_SIZE, config.CLARIFY_PATH or None,
+    generate=(lambda prompt: safe_generate(prompt, 30) if model_ready() else None) if config.CLARIFY_LEARN else None,
+)
+
+def safe_generate_batch(requests):
+    if not AI_AVAILABLE: return [""] * len(requests)
+    try:
+        return batcher.submit(requests)
+    except Exception as e:
+        logger.warning(f"Batch generation failed: {e}")
+        metrics.GENERATION_ERRORS.inc(len(requests), source="safe_generate_batch")
+        return [""] * len(requests)
 
-def get_expert_plan(problem):
-    # 1. Try Retrieval
-    template = knowledge_base.find_template(problem)
+def find_template(text):
+    """knowledge_base lookup, counted by topic. Templates hot-reload (shared with model.py)."""
+    kb = model.KNOWLEDGE.current
+    with metrics.stage("retrieval"):
+        matches = kb.index.match(text)
+    topic = matches[0][0] if matches else ""
+    metrics.TEMPLATE_LOOKUPS.inc(result="hit" if matches else "miss", topic=topic)
+    return kb.templates[topic] if matches else None
+
+def generate_outputs(problem, field_prompts):
+    if config.GENERATION_MODE == "structured":
+        # Whole plan in one generation; only unparsed sections get their own prompt
+        parsed = model.parse_structured(safe_generate(model.STRUCTURED_PROMPT.format(problem=problem), model.STRUCTURED_MAX_TOKENS))
+        missing = [i for i in range(len(field_prompts)) if i not in parsed]
+        parsed.update(zip(missing, safe_generate_batch([field_prompts[i] for i in missing])))
+        return [parsed[i] for i in range(len(field_prompts))]
+    # One padded batch for every field instead of eight sequential calls
+    return safe_generate_batch(field_prompts)
+
+def get_expert_plan(problem, template):
+    # 1. Try Retrieval (the caller's find_template result)
     
     if template:
         logger.info(f"RETRIEVAL SUCCESS: Found template.")
@@ -63,29 +147,32 @@ def get_expert_plan(problem):
     # 2. Fallback to General AI Inference (Improved Prompts)
     logger.info("RETRIEVAL FAILED: Using General Inference.")
     
-    # Root Causes - Direct listing prompt
-    c_raw = safe_generate(f"List 3 difficulties in '{problem}'. Difficulty 1:", 80)
+    field_prompts = [
+        # Root Causes - Direct listing prompt
+        (f"List 3 difficulties in '{problem}'. Difficulty 1:", 80),
+        # Steps - Direct action prompt
+        (f"List 3 physical steps to finish '{problem}'. Step 1:", 100),
+        # Timeline - Direct prompt
+        (f"What is the single most important task for Day 1 of '{problem}'?", 40),
+        (f"What is the task for Day 2 of '{problem}'?", 40),
+        (f"What is the goal for Week 1 of '{problem}'?", 40),
+        # 24h
+        (f"What is the very first tiny action for '{problem}' RIGHT NOW?", 40),
+        (f"What preparation can be done TONIGHT for '{problem}'?", 40),
+        (f"What is the main priority for TOMORROW regarding '{problem}'?", 40),
+    ]
+    with metrics.stage("generate"):
+        outputs = generate_outputs(problem, field_prompts)
+    c_raw, s_raw, day_1, day_2, week_1, now, tonight, tomorrow = outputs
+
     causes = [c.strip() for c in c_raw.split(',') if len(c)>4][:3]
     if len(causes) < 2: causes = ["Unclear Scope", "Lack of definition", "Starting friction"]
 
-    # Steps - Direct action prompt
-    s_raw = safe_generate(f"List 3 physical steps to finish '{problem}'. Step 1:", 100)
     steps = [s.strip() for s in s_raw.split(',') if len(s)>4][:4]
     if len(steps) < 2: steps = ["Define the exact goal", "Break it down", "Execute first task"]
 
-    # Timeline - Direct prompt
-    timeline = {
-        "day_1": safe_generate(f"What is the single most important task for Day 1 of '{problem}'?", 40),
-        "day_2": safe_generate(f"What is the task for Day 2 of '{problem}'?", 40),
-        "week_1": safe_generate(f"What is the goal for Week 1 of '{problem}'?", 40)
-    }
-
-    # 24h
-    action_plan = {
-        "now": safe_generate(f"What is the very first tiny action for '{problem}' RIGHT NOW?", 40),
-        "tonight": safe_generate(f"What preparation can be done TONIGHT for '{problem}'?", 40),
-        "tomorrow": safe_generate(f"What is the main priority for TOMORROW regarding '{problem}'?", 40)
-    }
+    timeline = {"day_1": day_1, "day_2": day_2, "week_1": week_1}
+    action_plan = {"now": now, "tonight": tonight, "tomorrow": tomorrow}
     
     return FinalPlan(
         root_causes=causes,
@@ -99,29 +186,43 @@ def get_expert_plan(problem):
 @app.get("/")
 def read_root(): return FileResponse('index.html')
 
+@app.get("/healthz")
+def healthz(): return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(): return JSONResponse(status_code=200 if MODEL_STATUS == "ready" else 503, content={"status": MODEL_STATUS})  # not when the load failed
+
+def warming_response():
+    return JSONResponse(status_code=503, headers={"Retry-After": "5"}, content={"status": "warming", "detail": f"Model is {MODEL_STATUS}; retry shortly."})
+
+@app.get("/metrics")
+def prometheus_metrics(): return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+def stats():
+    """Micro-batching queue depth, batch-size distribution and clarifier counters."""
+    return {"scheduler": batcher.stats() if batcher else None, "clarifier": clarifications.stats()}
+
 @app.post("/chat", response_model=ChatResponse)
 def chat_endpoint(req: ChatRequest):
     history = req.conversation_history
     user_turns = len([m for m in history if m.role == 'user'])
     user_input = history[-1].content.strip()
+    full_problem = " ".join([m.content for m in history if m.role == 'user'])
+    # Looked up once: on a first turn the problem is the input itself
+    template = find_template(full_problem)
 
     # --- AMBIGUITY CHECK ---
     # Fix for "Help me" -> "Who wrote Help Me?" hallucination.
     # If input is super short and vague, we return a canned response.
-    if user_turns == 1:
-        if len(user_input.split()) < 3 and "help" in user_input.lower():
-            return ChatResponse(type='question', text="I'm here to help. What specific goal are we planning today?")
-        
-        # General short input check
-        if len(user_input.split()) < 3 and not knowledge_base.find_template(user_input):
-             # Try to clarify 
-             q = safe_generate(f"Ask user for details about '{user_input}'. Question:", 30)
-             if "question" in q.lower() or len(q) < 5: q = "Could you give me more details?"
-             return ChatResponse(type='question', text=q)
+    if user_turns == 1 and len(user_input.split()) < 3:
+        if "help" in user_input.lower() or not template:
+            with metrics.stage("clarify"):
+                return ChatResponse(type='question', text=clarifications.question(user_input))
     
     # --- PLAN GENERATION ---
-    full_problem = " ".join([m.content for m in history if m.role == 'user'])
-    plan = get_expert_plan(full_problem)
+    if not model_ready() and not template: return warming_response()
+    plan = get_expert_plan(full_problem, template)
     
     return ChatResponse(type='plan', plan=plan)
 
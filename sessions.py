@@ -0,0 +1,105 @@
+# sessions.py — Server-side Conversation Sessions
+# Clients send only the new message plus a session id; the server keeps what
+# the plan needs from earlier turns: the user messages joined so far and the
+# number of user turns. Both are updated in place on each turn, so per-turn
+# work does not grow with the length of the conversation. A turn is read with
+# get() and only stored with add_turn() once it has been answered, so a client
+# retrying after a 503/504 does not record its message twice.
+#   MemorySessionStore   bounded, least-recently-active evicted first, idle expiry
+#   SQLiteSessionStore   one shared file: survives restarts and works across serve.py workers
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlite_conn import SQLiteConnection
+
+class Session:
+    __slots__ = ("id", "problem", "turns", "updated")
+
+    def __init__(self, id: str, problem: str = "", turns: int = 0, updated: float = 0.0):
+        self.id, self.problem, self.turns, self.updated = id, problem, turns, updated
+
+def new_id() -> str:
+    return secrets.token_urlsafe(16)
+
+class MemorySessionStore:
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 1800):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions = OrderedDict()  # id -> Session; most recently active last
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """A snapshot of the session, or None if unknown or expired."""
+        with self.lock:
+            self._expire(time.time())
+            session = self.sessions.get(session_id)
+            return Session(session.id, session.problem, session.turns, session.updated) if session else None
+
+    def add_turn(self, session_id: str, message: str):
+        """Appends a user message, creating the session if it is new (or has expired meanwhile)."""
+        now = time.time()
+        with self.lock:
+            session = self.sessions.pop(session_id, None) or Session(session_id)
+            session.problem = f"{session.problem} {message}" if session.problem else message
+            session.turns += 1
+            session.updated = now
+            self.sessions[session_id] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._expire(time.time())
+            return {"backend": "memory", "sessions": len(self.sessions), "evictions": self.evictions, "expired": self.expired}
+
+    def _expire(self, now):
+        # Ordered by last activity, so expired sessions are all at the front
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.updated <= self.idle_ttl: break
+            self.sessions.popitem(last=False)
+            self.expired += 1
+
+class SQLiteSessionStore(SQLiteConnection):
+    def __init__(self, path: str, idle_ttl: float = 1800):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.reopen()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, problem TEXT, turns INTEGER, updated REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+        self.conn.commit()
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, problem, turns, updated FROM sessions WHERE id = ? AND updated >= ?",
+                (session_id, time.time() - self.idle_ttl),
+            ).fetchone()
+        return Session(*row) if row else None
+
+    def add_turn(self, session_id: str, message: str):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE updated < ?", (now - self.idle_ttl,))
+            # Incremental update: the stored text is appended to, never re-sent
+            updated = self.conn.execute(
+                "UPDATE sessions SET problem = problem || ' ' || ?, turns = turns + 1, updated = ? WHERE id = ?",
+                (message, now, session_id),
+            ).rowcount
+            if not updated: self.conn.execute("INSERT INTO sessions VALUES (?, ?, 1, ?)", (session_id, message, now))
+            self.conn.commit()
+
+    def stats(self) -> dict:
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM sessions WHERE updated >= ?", (time.time() - self.idle_ttl,)).fetchone()[0]
+        return {"backend": "sqlite", "sessions": count}
+
+def make_store(max_sessions: int, idle_ttl: float, path: Optional[str] = None):
+    return SQLiteSessionStore(path, idle_ttl) if path else MemorySessionStore(max_sessions, idle_ttl)
@@ -0,0 +1,16 @@
+# sqlite_conn.py — Fork-safe SQLite Connections
+# The plan cache and the session store can each live in one SQLite file shared
+# by every serve.py worker. A connection must not cross fork(), so each worker
+# reopens its own after forking (serve.py calls reopen()).
+
+import sqlite3
+import threading
+
+class SQLiteConnection:
+    """Mixin: a locked connection to self.path, reopened per process."""
+    path: str
+
+    def reopen(self):
+        """SQLite connections must not cross fork(); each worker process opens its own."""
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
@@ -0,0 +1,79 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from admission import Admission, DeadlineExceeded
+
+def test_shed_past_max_in_flight():
+    a = Admission(max_in_flight=2)
+    assert a.enter() and a.enter()
+    assert not a.enter()
+    a.leave()
+    assert a.enter()
+    assert a.stats()["totals"]["shed"] == 1
+
+def test_decide_admits_until_the_queue_is_full():
+    a = Admission(degrade_at=2, workers=1)
+    assert a.decide(10) is None
+    with a.slot(), a.slot():
+        assert a.decide(10) == "queue"
+    assert a.decide(10) is None
+    assert a.stats()["totals"]["degraded_queue"] == 1
+
+def test_decide_degrades_when_the_expected_wait_misses_the_deadline():
+    a = Admission(degrade_at=100, workers=2)
+    a.latency = 1.0
+    assert a.expected_wait() == 1.0
+    assert a.decide(1.5) is None
+    a.admitted = 2  # a third request waits for a second round
+    assert a.expected_wait() == 2.0
+    assert a.decide(1.5) == "deadline"
+    assert a.stats()["totals"]["degraded_deadline"] == 1
+
+def test_completed_slots_feed_the_estimate():
+    a = Admission(alpha=0.5)
+    with a.slot(): time.sleep(0.02)
+    first = a.latency
+    assert first >= 0.02
+    with a.slot(): pass
+    assert a.latency < first
+
+def test_timeouts_are_counted_and_feed_the_estimate():
+    a = Admission()
+    with pytest.raises(DeadlineExceeded):
+        with a.slot():
+            time.sleep(0.02)
+            raise DeadlineExceeded()
+    assert a.latency >= 0.02
+    assert a.admitted == 0
+    assert a.stats()["totals"]["degraded_timeout"] == 1
+
+def test_abandoned_slots_do_not_feed_the_estimate():
+    a = Admission()
+    with pytest.raises(ConnectionError):
+        with a.slot(): raise ConnectionError()
+    assert a.latency is None and a.admitted == 0
+
+def test_background_work_waits_for_half_the_soft_limit():
+    a = Admission(degrade_at=4)  # background_limit 2
+    entered = threading.Event()
+    def background():
+        with a.slot(background=True): entered.set()
+    with a.slot(), a.slot():
+        assert a.overloaded()
+        worker = threading.Thread(target=background)
+        worker.start()
+        assert not entered.wait(0.2)
+    assert entered.wait(2)
+    worker.join()
+
+def test_waiting_background_work_can_be_cancelled():
+    a = Admission(degrade_at=2)  # background_limit 1
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    with a.slot():
+        with pytest.raises(CancelledError):
+            with a.slot(background=True, cancel=cancel): pass
+    assert a.admitted == 0
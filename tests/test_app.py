@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import config
+
+PROBLEM = "build a rocket ship in my garage"  # no template, so the model answers
+
+@pytest.fixture(scope="module")
+def client():
+    saved = config.BACKEND, config.MOCK_TOKEN_DELAY_MS
+    config.BACKEND, config.MOCK_TOKEN_DELAY_MS = "mock", 0
+    if not app.brain.available:
+        app.brain.warmup = lambda: None
+        app.brain.load_model()
+        app.brain.status = "ready"
+    yield TestClient(app.app)
+    config.BACKEND, config.MOCK_TOKEN_DELAY_MS = saved
+
+def events(body):
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in body.strip().split("\n\n")]
+
+def test_stream_stores_the_turn_after_the_final_plan(client):
+    r = client.post("/chat/stream", json={"message": PROBLEM})
+    session_id = r.headers["X-Session-Id"]
+    assert events(r.text)[-1][0] == "plan"
+    assert app.session_store.get(session_id).turns == 1
+
+def test_failed_stream_does_not_store_the_turn(client, monkeypatch):
+    def failing(*args, **kwargs):
+        raise RuntimeError("backend died")
+        yield
+    monkeypatch.setattr(app.brain, "stream_plan", failing)
+    r = client.post("/chat/stream", json={"message": PROBLEM})
+    assert r.headers["X-Session-Id"]
+    assert [e for e, _ in events(r.text)] == ["error"]
+    assert app.session_store.get(r.headers["X-Session-Id"]) is None
+
+def test_readyz_is_503_when_the_model_failed_to_load(client, monkeypatch):
+    assert client.get("/readyz").status_code == 200
+    monkeypatch.setattr(app.brain, "status", "unavailable")
+    r = client.get("/readyz")
+    assert r.status_code == 503 and r.json()["status"] == "unavailable"
+
+@pytest.mark.parametrize("problem", ['learn "python" fast', "back\\slash \\n and\nnewline\ttab", "apprendre à coder 🚀 – 编程", "</script> "])
+@pytest.mark.parametrize("session_id", [None, 'id"with\\quote'])
+@pytest.mark.parametrize("degraded", [False, True])
+def test_template_bytes_match_pydantic(problem, session_id, degraded):
+    kb = app.model.KNOWLEDGE.current
+    for topic in kb.plans:
+        spliced = app.template_response_json(kb.plan_json(topic, problem), session_id, degraded)
+        plan = kb.plans[topic].model_copy(update={"problem": problem})
+        expected = app.ChatResponse(type="plan", plan=plan, session_id=session_id, degraded=degraded).model_dump_json()
+        assert spliced == expected.encode()
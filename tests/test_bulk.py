@@ -0,0 +1,56 @@
+import json
+import time
+
+import bulk
+from bulk import BulkPlanner, completed_lines
+
+class FakeBrain:
+    """Keyword hits for problems starting with 'kb', model plans (slowest first) for the rest."""
+    def __init__(self):
+        self.generated = []
+
+    def template_json(self, problem):
+        return json.dumps({"template": problem}).encode() if problem.startswith("kb") else None
+
+    def retrieve_plan(self, problem):
+        return None
+
+    def generate_plan(self, problem, cancel=None):
+        if problem == "boom": raise RuntimeError("model failed")
+        time.sleep(0.05 if problem.endswith("0") else 0)
+        self.generated.append(problem)
+        return json.dumps({"plan": problem})
+
+def run(raw, skip=0, window=4):
+    brain = FakeBrain()
+    return [json.loads(line) for line in BulkPlanner(brain, window).lines(raw, skip=skip)], brain
+
+def test_output_follows_input_order():
+    out, _ = run([json.dumps(f"p{i}") for i in range(10)] + ['{"problem": "kb x"}'], window=3)
+    assert out == [{"plan": f"p{i}"} for i in range(10)] + [{"template": "kb x"}]
+
+def test_every_problem_gets_a_line():
+    raw = ['"a"', "", "{bad", '{"conversation_history": [{"role": "user", "content": "b"}]}', '"boom"', b'"c"\n']
+    out, _ = run(raw)
+    assert out[0] == {"plan": "a"} and out[2] == {"plan": "b"} and out[4] == {"plan": "c"}
+    assert "error" in out[1] and "invalid JSON" in out[1]["error"]
+    assert out[3] == {"error": "plan failed: model failed"}
+    assert len(out) == 5  # blank lines are not problems
+
+def test_resume_skips_completed_problems(tmp_path):
+    path = tmp_path / "plans.jsonl"
+    path.write_bytes(b'{"plan": "p0"}\n{"plan": "p1"}\n{"pla')
+    skip = completed_lines(str(path))
+    assert skip == 2
+    assert path.read_bytes() == b'{"plan": "p0"}\n{"plan": "p1"}\n'  # partial line cut off
+    out, brain = run(["", '"p0"', '"p1"', '"p2"', '"p3"'], skip=skip)
+    assert out == [{"plan": "p2"}, {"plan": "p3"}]
+    assert sorted(brain.generated) == ["p2", "p3"]
+
+def test_completed_lines_of_missing_file(tmp_path):
+    assert completed_lines(str(tmp_path / "none.jsonl")) == 0
+
+def test_parse_problem_forms():
+    assert bulk.parse_problem('"  x "') == "x"
+    assert bulk.parse_problem('{"problem": "y"}') == "y"
+    assert bulk.parse_problem("   ") is None
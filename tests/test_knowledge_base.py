@@ -0,0 +1,33 @@
+from knowledge_base import KeywordIndex
+
+TEMPLATES = {
+    "fitness": {"keywords": ["run", "gym", "work out"]},
+    "coding": {"keywords": ["code", "python"]},
+    "cooking": {"keywords": ["cook", "python"]},
+    "general": {"keywords": ["help"]},
+}
+INDEX = KeywordIndex(TEMPLATES)
+
+def topics(text):
+    return [topic for topic, _ in INDEX.match(text)]
+
+def test_keywords_match_whole_words_only():
+    assert topics("let's meet for brunch") == []
+    assert topics("my gymnastics class") == []
+    assert topics("I want to run") == ["fitness"]
+
+def test_common_endings_still_match():
+    assert topics("two runs and more gyms") == ["fitness"]
+    assert topics("I coded all night") == ["coding"]
+
+def test_case_punctuation_and_phrases():
+    assert topics("Learning to CODE!") == ["coding"]
+    assert topics("time to work out.") == ["fitness"]
+
+def test_more_hits_win_and_ties_go_to_the_earlier_topic():
+    assert INDEX.match("run to the gym, then code") == [("fitness", 2), ("coding", 1)]
+    assert topics("python") == ["coding", "cooking"]
+
+def test_general_is_never_matched():
+    assert topics("help") == []
+    assert KeywordIndex({"general": {"keywords": ["help"]}}).match("help") == []
@@ -0,0 +1,44 @@
+import plan_cache
+from plan_cache import PlanCache, make_key
+
+GREEDY = {"do_sample": False, "num_beams": 1}
+PLAN = {"root_causes": ["a", "b"], "steps": ["c", "d"]}
+
+def test_key_ignores_case_and_spacing():
+    assert make_key("Learn  Python\n", GREEDY) == make_key("learn python", GREEDY)
+    assert make_key("learn python", GREEDY) != make_key("learn rust", GREEDY)
+
+def test_key_depends_on_decoding():
+    assert make_key("learn python", GREEDY) != make_key("learn python", {**GREEDY, "num_beams": 4})
+    assert make_key("x", {"a": 1, "b": 2}) == make_key("x", {"b": 2, "a": 1})
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(plan_cache.time, "time", lambda: now[0])
+    cache = PlanCache(ttl=60)
+    cache.set("k", PLAN)
+    now[0] += 59
+    assert cache.get("k") == PLAN
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_is_evicted():
+    cache = PlanCache(max_entries=2)
+    cache.set("a", PLAN)
+    cache.set("b", PLAN)
+    cache.get("a")
+    cache.set("c", PLAN)
+    assert cache.get("b") is None
+    assert cache.get("a") == PLAN and cache.get("c") == PLAN
+    assert cache.stats()["evictions"] == 1
+
+def test_byte_cap_bounds_memory():
+    cache = PlanCache(max_bytes=200)
+    for i in range(10): cache.set(str(i), PLAN)
+    assert 0 < cache.stats()["bytes"] <= 200
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "plans.db")
+    PlanCache(path=path).set("k", PLAN)
+    assert PlanCache(path=path).get("k") == PLAN
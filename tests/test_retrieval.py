@@ -0,0 +1,38 @@
+import numpy as np
+
+from retrieval import HashingEmbedder, SemanticIndex, build_index
+
+TEMPLATES = {
+    "fitness": {
+        "keywords": ["gym", "fitness"], "root_causes": ["No motivation to train", "Irregular workout schedule"],
+        "steps": ["Pick a fixed workout time", "Start with short runs"], "psychology_tip": "Action creates motivation.",
+    },
+    "finance": {
+        "keywords": ["budget", "money"], "root_causes": ["No spending overview", "Impulse purchases"],
+        "steps": ["Track every expense", "Set a monthly savings goal"], "psychology_tip": "Pay yourself first.",
+    },
+    "general": {"keywords": [], "root_causes": ["Unclear scope"], "steps": ["Plan"], "psychology_tip": "Start."},
+}
+
+def build(tmp_path, templates=TEMPLATES):
+    build_index(templates, HashingEmbedder(), str(tmp_path))
+    return SemanticIndex(str(tmp_path))
+
+def test_reworded_query_finds_its_template(tmp_path):
+    index = build(tmp_path)
+    assert isinstance(index.matrix, np.memmap)
+    assert index.threshold == HashingEmbedder.threshold  # recorded at build time
+    matches = index.search("my workout schedule keeps slipping and I lack motivation")
+    assert matches[0][0] == "fitness" and matches[0][1] >= index.threshold
+    assert index.search("track my expenses and savings")[0][0] == "finance"
+
+def test_unrelated_query_is_below_the_threshold(tmp_path):
+    assert build(tmp_path).search("how do I file my taxes") == []
+
+def test_general_is_not_indexed(tmp_path):
+    assert build(tmp_path).topics == ["fitness", "finance"]
+    assert build(tmp_path / "empty", {"general": TEMPLATES["general"]}).search("anything at all") == []
+
+def test_explicit_threshold_overrides_the_recorded_one(tmp_path):
+    build(tmp_path)
+    assert SemanticIndex(str(tmp_path), threshold=0.99).search("my workout schedule keeps slipping") == []
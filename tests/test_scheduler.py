@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from scheduler import MicroBatcher
+
+def upper(requests):
+    return [prompt.upper() for prompt, _ in requests]
+
+def test_concurrent_prompts_share_a_batch_in_order():
+    sizes = []
+    batcher = MicroBatcher(lambda reqs: sizes.append(len(reqs)) or upper(reqs), max_batch_size=16, max_wait_ms=100)
+    futures = batcher.submit_async([(f"p{i}", 8) for i in range(6)])
+    assert [f.result(timeout=5) for f in futures] == [f"P{i}" for i in range(6)]
+    assert sizes == [6]
+
+def test_batches_never_exceed_max_size():
+    sizes = []
+    batcher = MicroBatcher(lambda reqs: sizes.append(len(reqs)) or upper(reqs), max_batch_size=2, max_wait_ms=50)
+    assert batcher.submit([(f"p{i}", 8) for i in range(5)]) == [f"P{i}" for i in range(5)]
+    assert max(sizes) <= 2 and sum(sizes) == 5
+
+def test_cancel_withdraws_queued_prompts():
+    release, seen = threading.Event(), []
+    def slow(reqs):
+        seen.extend(p for p, _ in reqs)
+        release.wait(5)
+        return upper(reqs)
+    batcher = MicroBatcher(slow, max_batch_size=1, max_wait_ms=0)
+    first = batcher.submit_async([("first", 8)])
+    while not seen: time.sleep(0.01)  # the worker is now busy with "first"
+    cancel = threading.Event()
+    threading.Timer(0.1, cancel.set).start()
+    with pytest.raises(CancelledError):
+        batcher.submit([("second", 8)], cancel)
+    release.set()
+    assert first[0].result(timeout=5) == "FIRST"
+    batcher.submit([("third", 8)])
+    assert "second" not in seen
+    assert batcher.stats()["cancelled"] == 1
+
+def test_already_cancelled_is_never_queued():
+    cancel = threading.Event()
+    cancel.set()
+    batcher = MicroBatcher(upper)
+    with pytest.raises(CancelledError):
+        batcher.submit([("p", 8)], cancel)
+    assert batcher.stats()["queue_depth"] == 0
+
+def test_batch_failure_reaches_every_caller():
+    def fail(reqs): raise RuntimeError("model down")
+    batcher = MicroBatcher(fail, max_wait_ms=50)
+    futures = batcher.submit_async([("a", 8), ("b", 8)])
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=5)
+
+def test_early_rows_resolve_before_the_batch_ends():
+    release = threading.Event()
+    def rows(reqs, on_row):
+        on_row(1, "SHORT")
+        release.wait(5)
+        return ["LONG", "ignored"]
+    batcher = MicroBatcher(rows, max_wait_ms=50, early_rows=True)
+    long_row, short_row = batcher.submit_async([("long", 100), ("short", 40)])
+    assert short_row.result(timeout=5) == "SHORT"
+    assert not long_row.done()
+    release.set()
+    assert long_row.result(timeout=5) == "LONG"
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import sessions
+from sessions import MemorySessionStore, SQLiteSessionStore, make_store
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return make_store(100, idle_ttl=60, path=str(tmp_path / "sessions.db") if request.param == "sqlite" else None)
+
+def test_turns_accumulate(store):
+    assert store.get("s") is None
+    store.add_turn("s", "learn python")
+    store.add_turn("s", "in a month")
+    session = store.get("s")
+    assert (session.problem, session.turns) == ("learn python in a month", 2)
+
+def test_idle_sessions_expire(store, clock):
+    store.add_turn("s", "learn python")
+    clock[0] += 59
+    assert store.get("s").turns == 1
+    store.add_turn("s", "again")  # activity restarts the idle clock
+    clock[0] += 59
+    assert store.get("s").turns == 2
+    clock[0] += 2
+    assert store.get("s") is None
+    store.add_turn("s", "fresh start")  # an expired id starts over
+    assert store.get("s").turns == 1
+
+def test_memory_store_evicts_the_least_recently_active():
+    store = MemorySessionStore(max_sessions=2)
+    store.add_turn("a", "x")
+    store.add_turn("b", "x")
+    store.add_turn("a", "y")
+    store.add_turn("c", "x")
+    assert store.get("b") is None
+    assert store.get("a").turns == 2 and store.get("c").turns == 1
+    assert store.stats()["evictions"] == 1
+
+def test_snapshots_are_not_live():
+    store = MemorySessionStore()
+    store.add_turn("s", "x")
+    session = store.get("s")
+    store.add_turn("s", "y")
+    assert session.turns == 1
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_sqlite_store_reopens_after_fork(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store.add_turn("s", "parent")
+    pid = os.fork()
+    if pid == 0:  # worker: its own connection to the shared file
+        try:
+            store.reopen()
+            store.add_turn("s", "child")
+            os._exit(0)
+        except BaseException:
+            os._exit(1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert store.get("s").problem == "parent child"
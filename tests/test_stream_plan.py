@@ -0,0 +1,22 @@
+import time
+
+import config
+import model
+
+def test_sections_arrive_as_their_rows_finish(monkeypatch):
+    # 5 ms per token: the 40-token sections are done at ~0.2 s, root causes at ~0.4 s, steps at ~0.5 s
+    monkeypatch.setattr(config, "BACKEND", "mock")
+    monkeypatch.setattr(config, "MOCK_TOKEN_DELAY_MS", 5)
+    brain = model.LifeGuideAI(deterministic=False, autoload=False, generation_mode="fields")
+    monkeypatch.setattr(brain, "warmup", lambda: None)
+    brain.load_model()
+
+    start, arrivals = time.perf_counter(), []
+    for item in brain.stream_plan("build a rocket ship in my garage", lookup=False):
+        if isinstance(item, dict) and item["field"] != "psychology_tip":  # the tip is not generated
+            arrivals.append((item["field"], time.perf_counter() - start))
+    assert isinstance(item, model.FinalPlan)
+    assert len(arrivals) == len(model.PLAN_PROMPTS)
+    assert arrivals[-1][0] == "steps"
+    first, last = arrivals[0][1], arrivals[-1][1]
+    assert first < 0.6 * last
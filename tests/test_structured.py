@@ -0,0 +1,34 @@
+from model import STRUCTURED_LABELS, parse_structured
+
+def test_label_format():
+    text = ("Causes: fear, no time, no plan. Steps: list, start, review, rest. "
+            "Day 1: outline. Day 2: draft. Week 1: finish. Now: open file. Tonight: sleep early. Tomorrow: write.")
+    found = parse_structured(text)
+    assert sorted(found) == list(range(len(STRUCTURED_LABELS)))
+    assert found[0] == "fear, no time, no plan"
+    assert found[2] == "outline"
+    assert found[7] == "write"
+
+def test_list_sections_accept_semicolons_and_newlines():
+    assert parse_structured("Causes: fear; no time\nno plan\n")[0] == "fear, no time, no plan"
+
+def test_missing_and_empty_sections_are_absent():
+    found = parse_structured("Steps: start. Day1: outline. Now: .")
+    assert found == {1: "start", 2: "outline"}
+
+def test_json_object_with_label_keys():
+    found = parse_structured('Sure! {"causes": ["fear", "no time"], "day_1": "outline", "Week1": "finish"}')
+    assert found == {0: "fear, no time", 2: "outline", 4: "finish"}
+
+def test_json_null_and_non_strings_are_missing():
+    assert parse_structured('{"causes": null}') == {}
+    assert parse_structured('{"causes": ["fear", null, 3, " "], "steps": 4, "now": {"a": 1}, "tonight": "  "}') == {0: "fear"}
+
+def test_unparseable_text_finds_nothing():
+    assert parse_structured("I cannot help with that.") == {}
+    assert parse_structured("{not json") == {}
+
+def test_hyphens_and_mid_sentence_words_are_not_labels():
+    found = parse_structured("Causes: fear, no time. Steps: start now - then review, rest. Day 1: outline. Now: open the file.")
+    assert found == {0: "fear, no time", 1: "start now - then review, rest", 2: "outline", 5: "open the file"}
+    assert parse_structured("Steps: do it now: quickly") == {1: "do it now: quickly"}
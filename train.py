@@ -1,7 +1,33 @@
 # train.py — Fine-Tuning Script for Life Breakdown Assistant
+# Data pipeline:
+#   tokenize  batched and multi-process (--num-proc), truncated but not padded.
+#             Saved under --cache-dir, keyed by the source data, the tokenizer
+#             and the lengths, so unchanged data is never tokenized twice.
+#   batch     length-grouped (rows of similar length share a batch) and padded
+#             per batch by DataCollatorForSeq2Seq, not every row to 512.
+#   stream    --streaming tokenizes on the fly for corpora that do not fit in
+#             RAM, grouping by length within a bounded buffer (needs --max-steps).
+#
+# Offline run on the bundled fixture (tiny random T5, tokenizer built from the data):
+#   python train.py --fixture --tiny-model --max-steps 20
+# Pipeline timings: python -m benchmarks.train_pipeline
+#
+# Distillation (--distill): the serving model answers LifeGuideAI's plan prompts
+# for --problems, and flan-t5-small is trained on those answers. Serve the
+# result with LBA_MODEL=./distilled_model; compare with benchmarks/distill_eval.py.
+#   python train.py --distill --problems problems.jsonl --epochs 3
 
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import random
 import sys
-from datasets import load_dataset
+import time
+
+from datasets import load_dataset, load_from_disk
 from transformers import (
     AutoModelForSeq2SeqLM,
     AutoTokenizer,
@@ -10,60 +36,290 @@ from transformers import (
     DataCollatorForSeq2Seq
 )
 
-def train():
-    print("Loading datasets...")
-    # 1. Load the primary instruction dataset
-    ds_instruct = load_dataset("HuggingFaceH4/helpful_instructions", split="train[:1%]") # 1% for demo speed
-    
-    # 2. Load the empathy dataset (optional, for mixing)
-    # ds_empathy = load_dataset("facebook/empathetic_dialogues", split="train[:1%]")
+PROMPT_PREFIX = "Breakdown this life problem: "
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "train_tiny.jsonl")
+PROMPT_COLUMNS = ("prompt", "instruction", "input", "question")
+TARGET_COLUMNS = ("completion", "demonstration", "output", "response", "target")
+PIPELINE_VERSION = 1  # bump when preprocessing changes, so cached tokenizations are rebuilt
 
-    print("Loading Model & Tokenizer (flan-t5)...")
-    model_id = "google/flan-t5-small" # Using small for training demo
-    tokenizer = AutoTokenizer.from_pretrained(model_id)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_id)
+# Renamed across transformers releases
+EVAL_STRATEGY = "eval_strategy" if "eval_strategy" in inspect.signature(Seq2SeqTrainingArguments.__init__).parameters else "evaluation_strategy"
+TOKENIZER_ARG = "processing_class" if "processing_class" in inspect.signature(Seq2SeqTrainer.__init__).parameters else "tokenizer"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fine-tune flan-t5 on instruction data.")
+    parser.add_argument("--dataset", default="HuggingFaceH4/helpful_instructions")
+    parser.add_argument("--split", default="train[:1%]", help="1%% for demo speed")
+    parser.add_argument("--data-files", nargs="+", help="local JSON/JSONL files instead of --dataset")
+    parser.add_argument("--fixture", action="store_true", help="the bundled tiny dataset (fixtures/train_tiny.jsonl)")
+    parser.add_argument("--prompt-column", help=f"default: first of {', '.join(PROMPT_COLUMNS)}")
+    parser.add_argument("--target-column", help=f"default: first of {', '.join(TARGET_COLUMNS)}")
+    parser.add_argument("--model", default="google/flan-t5-small")
+    parser.add_argument("--tiny-model", action="store_true", help="random 2-layer T5 + word-level tokenizer from the data; no download")
+    parser.add_argument("--output-dir", help="default ./fine_tuned_model, or ./distilled_model with --distill")
+    parser.add_argument("--cache-dir", default="./.train_cache", help="tokenized datasets")
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count() or 1, help="tokenization processes")
+    parser.add_argument("--max-source-length", type=int, default=512)
+    parser.add_argument("--max-target-length", type=int, default=256)
+    parser.add_argument("--streaming", action="store_true", help="read and tokenize lazily instead of loading the dataset")
+    parser.add_argument("--buffer-batches", type=int, default=64, help="streaming: batches sorted by length together")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--epochs", type=float, default=1)
+    parser.add_argument("--max-steps", type=int, default=-1)
+    parser.add_argument("--learning-rate", type=float, help="default 2e-5, or 3e-4 with --distill")
+    parser.add_argument("--no-group-by-length", action="store_true", help="random batches (for comparison)")
+    parser.add_argument("--eval-fraction", type=float, default=0.05, help="held out for per-epoch eval loss (not with --streaming)")
+    parser.add_argument("--no-train", action="store_true", help="prepare the data and trainer, then stop")
+    parser.add_argument("--distill", action="store_true", help="train on the serving model's answers to the plan prompts for --problems")
+    parser.add_argument("--teacher", help="distill: teacher model (default LBA_MODEL, i.e. flan-t5-base)")
+    parser.add_argument("--problems", default=FIXTURE, help="distill: problems, one per line as text or JSON (a string, {\"problem\"} or {\"prompt\"})")
+    parser.add_argument("--teacher-batch-size", type=int, default=16, help="distill: prompts per teacher batch")
+    args = parser.parse_args(argv)
+    if args.fixture: args.data_files = [FIXTURE]
+    if args.output_dir is None: args.output_dir = "./distilled_model" if args.distill else "./fine_tuned_model"
+    if args.learning_rate is None: args.learning_rate = 3e-4 if args.distill else 2e-5
+    # A student must see exactly the prompts it will be served; dataset prompts get the instruction prefix
+    args.prompt_prefix = "" if args.distill else PROMPT_PREFIX
+    if args.streaming and args.max_steps <= 0: parser.error("--streaming needs --max-steps (a stream has no length)")
+    return args
 
-    # Preprocessing
+# --- Data ---
+
+def load_source(args):
+    if args.data_files:
+        return load_dataset("json", data_files=args.data_files, split="train", streaming=args.streaming)
+    # Slices like train[:1%] need the whole split; a stream reads from the start instead
+    split = args.split.split("[")[0] if args.streaming else args.split
+    return load_dataset(args.dataset, split=split, streaming=args.streaming)
+
+def find_columns(names, prompt_column=None, target_column=None):
+    prompt = prompt_column or next((c for c in PROMPT_COLUMNS if c in names), None)
+    target = target_column or next((c for c in TARGET_COLUMNS if c in names), None)
+    if prompt not in names or target not in names:
+        sys.exit(f"Could not find prompt/target columns in {sorted(names)}; pass --prompt-column and --target-column.")
+    return prompt, target
+
+def make_preprocess(tokenizer, prompt_column, target_column, max_source_length, max_target_length, prefix=PROMPT_PREFIX):
     def preprocess_function(examples):
-        # We assume the dataset has 'prompt' and 'completion' or similar fields
-        # This mapping depends on the exact dataset schema.
-        inputs = ["Breakdown this life problem: " + doc for doc in examples["prompt"]]
-        model_inputs = tokenizer(inputs, max_length=512, truncation=True)
-        
-        # Tokenize targets
-        targets = tokenizer(examples["completion"], max_length=512, truncation=True)
+        inputs = [prefix + (doc or "") for doc in examples[prompt_column]]
+        # No padding here: DataCollatorForSeq2Seq pads each batch to its own longest row
+        model_inputs = tokenizer(inputs, max_length=max_source_length, truncation=True)
+        targets = tokenizer(text_target=[t or "" for t in examples[target_column]], max_length=max_target_length, truncation=True)
         model_inputs["labels"] = targets["input_ids"]
+        # Read by the length-grouped sampler instead of measuring every row again
+        model_inputs["length"] = [len(ids) for ids in model_inputs["input_ids"]]
         return model_inputs
+    return preprocess_function
+
+def cache_key(args, ds, tokenizer, columns) -> str:
+    """Changes whenever the tokenized output could: source data, tokenizer vocabulary, columns or lengths."""
+    if args.data_files:
+        source = [(os.path.abspath(p), os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in args.data_files]
+    else:
+        source = [args.dataset, args.split, getattr(ds, "_fingerprint", None)]
+    vocab = hashlib.sha256(json.dumps(sorted(tokenizer.get_vocab().items())).encode()).hexdigest()
+    parts = [PIPELINE_VERSION, source, type(tokenizer).__name__, vocab, columns, args.prompt_prefix, args.max_source_length, args.max_target_length]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+def tokenize(ds, tokenizer, args, columns):
+    """Tokenized dataset, from --cache-dir when this exact data and tokenizer were seen before."""
+    preprocess = make_preprocess(tokenizer, *columns, args.max_source_length, args.max_target_length, args.prompt_prefix)
+    path = os.path.join(args.cache_dir, "tokenized-" + cache_key(args, ds, tokenizer, columns))
+    if os.path.isdir(path):
+        print(f"Reusing tokenized data from {path}")
+        return load_from_disk(path)
+    # Process start-up outweighs the work below a few thousand rows per process
+    num_proc = max(1, min(args.num_proc, len(ds) // 2000))
+    tokenized = ds.map(preprocess, batched=True, num_proc=num_proc, remove_columns=ds.column_names, desc="Tokenizing")
+    # Written aside and renamed, so an interrupted run never leaves a partial cache behind
+    tokenized.save_to_disk(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return load_from_disk(path)
+
+def length_grouped(examples, batch_size: int, buffer_batches: int, seed: int = 42):
+    """
+    Reorders a stream so each run of batch_size examples has similar lengths:
+    fills a buffer of buffer_batches batches, sorts it by length, cuts it into
+    batches and yields those in random order. Drops the `length` column.
+    """
+    rng = random.Random(seed)
+    buffer = []
+    def flush():
+        buffer.sort(key=lambda e: e["length"])
+        batches = [buffer[i:i + batch_size] for i in range(0, len(buffer), batch_size)]
+        rng.shuffle(batches)
+        buffer.clear()
+        for batch in batches:
+            for e in batch: yield {k: v for k, v in e.items() if k != "length"}
+    for example in examples:
+        buffer.append(example)
+        if len(buffer) >= batch_size * buffer_batches: yield from flush()
+    yield from flush()
+
+def stream_dataset(tokenized, batch_size: int, buffer_batches: int):
+    import torch
+
+    class LengthGroupedStream(torch.utils.data.IterableDataset):
+        def __iter__(self):
+            return length_grouped(iter(tokenized), batch_size, buffer_batches)
+
+    return LengthGroupedStream()
+
+def prepare(ds, tokenizer, args, names, columns):
+    """(train, eval) datasets ready for the trainer; eval is None when streaming."""
+    if args.streaming:
+        tokenized = ds.map(make_preprocess(tokenizer, *columns, args.max_source_length, args.max_target_length, args.prompt_prefix),
+                           batched=True, remove_columns=names)
+        return stream_dataset(tokenized, args.batch_size, args.buffer_batches), None
+    tokenized = tokenize(ds, tokenizer, args, columns)
+    if args.eval_fraction <= 0 or len(tokenized) < 20: return tokenized, None
+    split = tokenized.train_test_split(test_size=args.eval_fraction, seed=42)
+    return split["train"], split["test"]
+
+# --- Model ---
+
+def sample_texts(ds, columns, streaming: bool, prefix: str = PROMPT_PREFIX, limit: int = 10000):
+    rows = itertools.islice(ds, limit) if streaming else ds.select_columns(list(columns)).select(range(min(limit, len(ds))))
+    return [prefix + (r[columns[0]] or "") + " " + (r[columns[1]] or "") for r in rows]
+
+def tiny_model(texts):
+    """A random 2-layer T5 with a word-level tokenizer over `texts`: runs the whole pipeline without downloads."""
+    from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+    from tokenizers.processors import TemplateProcessing
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+
+    tok = Tokenizer(models.WordLevel(unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.train_from_iterator(texts, trainers.WordLevelTrainer(special_tokens=["<pad>", "</s>", "<unk>"]))
+    tok.post_processor = TemplateProcessing(single="$A </s>", special_tokens=[("</s>", tok.token_to_id("</s>"))])
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok, pad_token="<pad>", eos_token="</s>", unk_token="<unk>", model_input_names=["input_ids", "attention_mask"],
+    )
+    config = T5Config(
+        vocab_size=len(tokenizer), d_model=64, d_ff=128, d_kv=16, num_layers=2, num_heads=4,
+        pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id, decoder_start_token_id=tokenizer.pad_token_id,
+    )
+    return tokenizer, T5ForConditionalGeneration(config)
+
+# --- Distillation ---
+# Targets are the teacher's greedy answers to model.PLAN_PROMPTS, one example
+# per (problem, prompt), on the exact prompt text LifeGuideAI sends.
+
+def read_problems(path):
+    problems = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, dict): item = item.get("problem") or item.get("prompt")
+            if isinstance(item, str) and item.strip(): problems.append(item.strip())
+    return list(dict.fromkeys(problems))
+
+def teacher_outputs(args) -> str:
+    """JSONL of teacher answers for every (problem, plan prompt); reused while problems, prompts, teacher and backend are unchanged."""
+    import config
+    import model
+
+    problems = read_problems(args.problems)
+    teacher = args.teacher or model.LifeGuideAI.MODEL_ID
+    # The backend is part of the key: int8 or mock answers must not be reused as eager teacher targets
+    if config.BACKEND != "eager": print(f"Warning: teacher runs on the {config.BACKEND} backend (LBA_BACKEND), not eager.")
+    key = hashlib.sha256(json.dumps([teacher, config.BACKEND, problems, model.PLAN_PROMPTS, model.GREEDY_DECODING]).encode()).hexdigest()[:16]
+    path = os.path.join(args.cache_dir, f"teacher-{key}.jsonl")
+    if os.path.exists(path):
+        print(f"Reusing teacher outputs from {path}")
+        return path
+
+    # Greedy, so the targets are the teacher's most likely answers; load_weights raises rather than falling back to mock text
+    brain = model.LifeGuideAI(deterministic=True, autoload=False, model_id=teacher)
+    brain.load_weights()
+    rows = [
+        {"problem": problem, "field": field, "slot": slot, "prompt": prompt, "max_tokens": max_tokens}
+        for problem in problems
+        for (field, slot, _, _), (prompt, max_tokens) in zip(model.PLAN_PROMPTS, brain.plan_prompts(problem))
+    ]
+    # A batch decodes until its longest budget, so prompts with equal budgets go together
+    rows.sort(key=lambda r: r["max_tokens"])
+    os.makedirs(args.cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    with open(path + ".tmp", "w", encoding="utf-8") as out:
+        for i in range(0, len(rows), args.teacher_batch_size):
+            chunk = rows[i:i + args.teacher_batch_size]
+            outputs = brain.generate_batch([(r["prompt"], r["max_tokens"]) for r in chunk])
+            for row, text in zip(chunk, outputs):
+                out.write(json.dumps({**row, "completion": text}, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+    print(f"Teacher {teacher}: {len(rows)} answers for {len(problems)} problems in {time.perf_counter() - start:.0f}s")
+    return path
+
+def train(argv=None):
+    args = parse_args(argv)
+    # Tokenizers' own threads do not survive the fork into --num-proc workers
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    if args.distill:
+        print("Generating teacher outputs...")
+        args.data_files = [teacher_outputs(args)]
+        args.prompt_column, args.target_column = "prompt", "completion"
+
+    print("Loading datasets...")
+    ds = load_source(args)
+    names = ds.column_names or list(next(iter(ds)).keys())
+    columns = find_columns(names, args.prompt_column, args.target_column)
+
+    print("Loading Model & Tokenizer (flan-t5)...")
+    if args.tiny_model:
+        tokenizer, model = tiny_model(sample_texts(ds, columns, args.streaming, args.prompt_prefix))
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(args.model)
+        model = AutoModelForSeq2SeqLM.from_pretrained(args.model)
 
-    # Note: helpful_instructions requires specific column mapping check
-    # For this file to run theoretically, we typically filter for valid columns first.
-    print("Preprocessing data (mock step)...")
-    # tokenized_ds = ds_instruct.map(preprocess_function, batched=True)
+    print("Preprocessing data...")
+    start = time.perf_counter()
+    train_ds, eval_ds = prepare(ds, tokenizer, args, names, columns)
+    print(f"Data ready in {time.perf_counter() - start:.1f}s")
 
     # Setup Trainer
-    args = Seq2SeqTrainingArguments(
-        output_dir="./fine_tuned_model",
-        evaluation_strategy="epoch",
-        learning_rate=2e-5,
-        per_device_train_batch_size=4,
+    training_args = Seq2SeqTrainingArguments(
+        output_dir=args.output_dir,
+        learning_rate=args.learning_rate,
+        per_device_train_batch_size=args.batch_size,
+        per_device_eval_batch_size=args.batch_size,
         weight_decay=0.01,
         save_total_limit=3,
-        num_train_epochs=1,
-        predict_with_generate=True,
+        num_train_epochs=args.epochs,
+        max_steps=args.max_steps,
         logging_steps=10,
+        # Map-style data is batched by similar length here; streams were grouped in length_grouped
+        group_by_length=not (args.streaming or args.no_group_by_length),
+        length_column_name="length",
+        report_to="none",
+        **{EVAL_STRATEGY: "epoch" if eval_ds is not None else "no"},
     )
 
     trainer = Seq2SeqTrainer(
         model=model,
-        args=args,
-        train_dataset=ds_instruct, # Placeholder: Needs tokenized dataset
-        tokenizer=tokenizer,
-        data_collator=DataCollatorForSeq2Seq(tokenizer, model=model),
+        args=training_args,
+        train_dataset=train_ds,
+        eval_dataset=eval_ds,
+        # Pads each batch to its longest row (a multiple of 8); label padding is -100
+        data_collator=DataCollatorForSeq2Seq(tokenizer, model=model, pad_to_multiple_of=8),
+        **{TOKENIZER_ARG: tokenizer},
     )
+    if args.no_train:
+        print("Data and trainer ready (--no-train).")
+        return trainer
 
-    print("Starting Training (Demo mode)...")
-    # trainer.train() 
-    print("Training script structure ready. Uncomment 'trainer.train()' to execute.")
+    print("Starting Training...")
+    result = trainer.train()
+    trainer.save_model(args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+    print(f"Saved to {args.output_dir} ({result.metrics.get('train_samples_per_second')} samples/s).")
+    return trainer
 
 if __name__ == "__main__":
     train()